@@ -0,0 +1,254 @@
+"""Batch
+
+This module manages the parallel batch runner components.
+
+A manifest is a JSON-lines file with one job per line: an object with a
+"file" path (relative to the manifest) or an inline "program" list or
+text, an "inputs" list fed to READ in order and an optional "name".
+"""
+
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import redirect_stdout
+from typing import NamedTuple
+
+from controller import UVSimController
+from model import DataModel, decode_program, program_cache
+from uvb import read_image
+
+
+class BatchJob(NamedTuple):
+    """Program and READ inputs of one batch run.
+
+    source is a program file path or an inline program image.
+    """
+
+    index: int
+    name: str
+    source: object
+    inputs: tuple
+
+
+class BatchResult(NamedTuple):
+    """Outcome of one batch run.
+
+    status is a RunResult status, or "error" with the message in error.
+    """
+
+    index: int
+    name: str
+    status: str
+    outputs: list
+    accumulator: int
+    cursor: int
+    steps: int
+    error: str
+
+
+def load_manifest(filename: str) -> list:
+    """Loads batch jobs from a JSON-lines manifest.
+
+    :param filename: String containing manifest file path
+    :return jobs: BatchJob values in manifest order
+    """
+    root = os.path.dirname(os.path.abspath(filename))
+    jobs = []
+    with open(filename, "r") as f_in:
+        for number, line in enumerate(f_in, 1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+                if "file" in entry:
+                    source = os.path.join(root, entry["file"])
+                else:
+                    source = decode_program("", entry["program"])
+                inputs = tuple(int(value) for value in entry.get("inputs", ()))
+            except (ValueError, KeyError, TypeError, AttributeError) as error:
+                raise ValueError(f"Invalid job on line {number}: {error}")
+            name = entry.get("name", entry.get("file", f"{filename}:{number}"))
+            jobs.append(BatchJob(len(jobs), name, source, inputs))
+    return jobs
+
+
+worker = {}
+
+
+def init_worker(
+    memory_size: int = 100, max_steps=None, timeout=None, fuse: bool = False
+) -> None:
+    """Creates the warm VM reused by every job in a worker process.
+
+    Fusion is off by default: each job loads a new image, so the fusion scan
+    costs more than it saves unless jobs run for thousands of steps.
+
+    :param memory_size: Number of words in main memory
+    :param max_steps: Maximum number of instructions per job
+    :param timeout: Maximum wall-clock seconds per job
+    :param fuse: Whether to dispatch fused superinstructions
+    :return: None
+    """
+    worker["controller"] = UVSimController(
+        halted=lambda: None, data_model=DataModel(memory_size)
+    )
+    worker["limits"] = max_steps, timeout, fuse
+
+
+def run_job(job: BatchJob) -> BatchResult:
+    """Runs one job on the worker's warm VM.
+
+    Program files are parsed through the worker's program cache, so
+    repeated programs are only parsed once per worker. Engine messages are
+    suppressed so stdout only carries results.
+
+    :param job: Job to run
+    :return result: Outputs, final registers and step count of the run
+    """
+    if "controller" not in worker:
+        init_worker()
+    controller = worker["controller"]
+    max_steps, timeout, fuse = worker["limits"]
+    outputs = []
+    inputs = iter(job.inputs)
+
+    def read_from_user():
+        value = next(inputs, None)
+        if value is None:
+            raise ValueError("READ beyond provided inputs")
+        return value
+
+    controller.reset_accumulator()
+    controller.reset_cursor()
+    controller.reset_instruction()
+    controller.reset_io()
+    try:
+        with redirect_stdout(None):
+            if not isinstance(job.source, str):
+                image = job.source
+            elif job.source.endswith(".uvb"):
+                image = read_image(job.source)[1]
+            else:
+                image = program_cache.load(job.source)
+            controller.data_model.load_image(image)
+            result = controller.execute_bounded(
+                read_from_user,
+                outputs.append,
+                max_steps=max_steps,
+                timeout=timeout,
+                fuse=fuse,
+            )
+    except (ValueError, IndexError, OverflowError, OSError) as error:
+        return BatchResult(
+            job.index,
+            job.name,
+            "error",
+            outputs,
+            controller.data_model.accumulator,
+            controller.cursor,
+            controller.steps,
+            str(error),
+        )
+    return BatchResult(
+        job.index,
+        job.name,
+        result.status,
+        outputs,
+        result.accumulator,
+        result.cursor,
+        result.steps,
+        None,
+    )
+
+
+def run_chunk(jobs: list) -> list:
+    """Runs a chunk of jobs in order on the worker's warm VM.
+
+    :param jobs: BatchJob values
+    :return results: BatchResult values in job order
+    """
+    return [run_job(job) for job in jobs]
+
+
+def run_batch(
+    jobs,
+    workers=None,
+    chunk_size: int = 16,
+    memory_size: int = 100,
+    max_steps=None,
+    timeout=None,
+    fuse: bool = False,
+):
+    """Runs jobs over a process pool and yields results as chunks complete.
+
+    At most two chunks per worker are in flight, so jobs may be a lazy
+    iterable of any length.
+
+    :param jobs: Iterable of BatchJob values
+    :param workers: Number of worker processes, defaults to the CPU count
+    :param chunk_size: Number of jobs sent to a worker at once
+    :param memory_size: Number of words in main memory
+    :param max_steps: Maximum number of instructions per job
+    :param timeout: Maximum wall-clock seconds per job
+    :param fuse: Whether to dispatch fused superinstructions, see init_worker
+    :return: Generator of BatchResult in completion order
+    """
+    workers = workers or os.cpu_count() or 1
+    jobs = iter(jobs)
+
+    def next_chunk() -> list:
+        chunk = []
+        for job in jobs:
+            chunk.append(job)
+            if len(chunk) == chunk_size:
+                break
+        return chunk
+
+    with ProcessPoolExecutor(
+        workers,
+        initializer=init_worker,
+        initargs=(memory_size, max_steps, timeout, fuse),
+    ) as executor:
+        pending = set()
+        while True:
+            while len(pending) < 2 * workers:
+                chunk = next_chunk()
+                if not chunk:
+                    break
+                pending.add(executor.submit(run_chunk, chunk))
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
+
+
+def main():
+    """Main script driver."""
+    parser = argparse.ArgumentParser(description="Run UVSim programs in parallel.")
+    parser.add_argument("manifest")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--chunk-size", type=int, default=16)
+    parser.add_argument("--memory-size", type=int, default=100)
+    parser.add_argument("--max-steps", type=int)
+    parser.add_argument("--timeout", type=float)
+    parser.add_argument("--fuse", action="store_true")
+    args = parser.parse_args()
+
+    results = run_batch(
+        load_manifest(args.manifest),
+        args.workers,
+        args.chunk_size,
+        args.memory_size,
+        args.max_steps,
+        args.timeout,
+        args.fuse,
+    )
+    for result in results:
+        sys.stdout.write(json.dumps(result._asdict()) + "\n")
+
+
+if __name__ == "__main__":
+    main()
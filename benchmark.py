@@ -0,0 +1,284 @@
+"""Benchmark
+
+This module manages the interpreter benchmark components.
+"""
+
+import argparse
+import gc
+import importlib.util
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from unittest.mock import patch
+
+from controller import UVSimController
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def pad(program: list) -> list:
+    """Pads program instructions to a full memory image.
+
+    :param program: Program instructions starting at memory index 0
+    :return memory: Program followed by zeroed memory cells
+    """
+    return program + [0] * (100 - len(program))
+
+
+def counting_loop(count: int) -> list:
+    """Builds a tight loop decrementing a counter to zero.
+
+    :param count: Number of loop iterations
+    :return memory: Program memory image
+    """
+    program = pad([2010, 4205, 3111, 2110, 4000, 4300])
+    program[10], program[11] = count, 1
+    return program
+
+
+def arithmetic_kernel(count: int) -> list:
+    """Builds a loop exercising ADD, SUBTRACT, MULTIPLY and DIVIDE.
+
+    :param count: Number of loop iterations
+    :return memory: Program memory image
+    """
+    program = pad(
+        [2020, 4212, 2021, 3322, 3223, 3024, 2124, 2020, 3125, 2120, 4000, 0, 4300]
+    )
+    program[20:26] = [count, 37, 91, 7, 0, 1]
+    return program
+
+
+def self_modifying(count: int) -> list:
+    """Builds a loop that rewrites and executes one of its instructions.
+
+    :param count: Number of loop iterations
+    :return memory: Program memory image
+    """
+    program = pad([2020, 4209, 2021, 2104, 0, 2020, 3123, 2120, 4000, 4300])
+    program[20:24] = [count, 2022, 7, 1]
+    return program
+
+
+def io_loop(count: int) -> list:
+    """Builds a loop reading and writing one value per iteration.
+
+    :param count: Number of loop iterations
+    :return memory: Program memory image
+    """
+    program = pad([1020, 1120, 2021, 3122, 2121, 4207, 4000, 4300])
+    program[21], program[22] = count, 1
+    return program
+
+
+def load_text(filename: str) -> list:
+    """Loads a BasicML text file into a memory image.
+
+    :param filename: String containing file path
+    :return memory: Program memory image
+    """
+    controller = UVSimController()
+    controller.load_program(filename)
+    return list(controller.data_model.get_instructions())
+
+
+def make_workloads(scale: int = 1000) -> dict:
+    """Builds benchmark workloads.
+
+    :param scale: Loop iteration count for synthetic workloads
+    :return workloads: Memory image and READ input per workload name
+    """
+    workloads = {
+        "counting_loop": (counting_loop(scale), 1),
+        "arithmetic_kernel": (arithmetic_kernel(scale), 1),
+        "self_modifying": (self_modifying(scale), 1),
+        "io_loop": (io_loop(scale), 5),
+    }
+    for name in ("Test1", "Test2", "Test3"):
+        filename = os.path.join(ROOT, f"{name}.txt")
+        if os.path.exists(filename):
+            workloads[name] = (load_text(filename), 5)
+    return workloads
+
+
+def load_legacy_uvsim():
+    """Imports the standalone src/uvsim.py simulator.
+
+    :param: None
+    :return UVSim: Standalone simulator class
+    """
+    spec = importlib.util.spec_from_file_location(
+        "legacy_uvsim", os.path.join(ROOT, "src", "uvsim.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.UVSim
+
+
+def count_steps(program: list, value: int) -> int:
+    """Counts instructions executed by a workload.
+
+    :param program: Program memory image
+    :param value: Value returned by every READ
+    :return steps: Number of instructions executed until the run ends
+    """
+    controller = UVSimController(halted=lambda: None)
+    controller.data_model.set_instructions(list(program))
+    result = controller.execute_table(lambda: value, lambda output: None)
+    return result.steps
+
+
+def make_runner(engine: str, program: list, value: int):
+    """Builds a callable that runs a workload once on a fresh memory image.
+
+    :param engine: Engine name from UVSimController.ENGINES or "uvsim"
+    :param program: Program memory image
+    :param value: Value returned by every READ
+    :return setup, run: Callables resetting state and executing the program
+    """
+    if engine == "uvsim":
+        uvsim = load_legacy_uvsim()()
+
+        def setup():
+            uvsim.memory = list(program)
+            uvsim.accumulator = uvsim.instruction_counter = 0
+
+        def run():
+            with patch("builtins.input", return_value=str(value)), patch(
+                "builtins.print"
+            ):
+                try:
+                    uvsim.execute_program()
+                except SystemExit:
+                    pass
+
+        return setup, run
+
+    controller = UVSimController(halted=lambda: None)
+
+    def setup():
+        controller.data_model.set_instructions(list(program))
+        controller.reset_accumulator()
+        controller.reset_cursor()
+        controller.reset_instruction()
+
+    def run():
+        controller.execute_program(lambda: value, lambda output: None, engine)
+
+    return setup, run
+
+
+def percentile(samples: list, fraction: float) -> float:
+    """Gets nearest-rank percentile of samples.
+
+    :param samples: Measured values
+    :param fraction: Percentile as a fraction between 0 and 1
+    :return value: Sample at the requested rank
+    """
+    ordered = sorted(samples)
+    rank = max(int(round(fraction * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def measure(engine: str, program: list, value: int, steps: int, repeat: int) -> dict:
+    """Measures throughput, latency and memory use of one engine on a workload.
+
+    peak_bytes is the peak traced memory during one run and retained_blocks
+    the number of blocks allocated by that run that are still alive after
+    it. tracemalloc cannot count blocks allocated and freed within the run.
+
+    :param engine: Engine name from UVSimController.ENGINES or "uvsim"
+    :param program: Program memory image
+    :param value: Value returned by every READ
+    :param steps: Number of instructions executed per run
+    :param repeat: Number of timed runs
+    :return result: Machine-readable measurements
+    """
+    setup, run = make_runner(engine, program, value)
+    setup()
+    run()
+
+    latencies = []
+    for _ in range(repeat):
+        setup()
+        gc.disable()
+        start = time.perf_counter()
+        run()
+        latencies.append(time.perf_counter() - start)
+        gc.enable()
+
+    setup()
+    tracemalloc.start()
+    run()
+    snapshot = tracemalloc.take_snapshot()
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    best = min(latencies)
+    return {
+        "engine": engine,
+        "steps": steps,
+        "runs": repeat,
+        "instructions_per_second": steps / best if best else None,
+        "latency_ms": {
+            "min": best * 1000,
+            "p50": percentile(latencies, 0.5) * 1000,
+            "p90": percentile(latencies, 0.9) * 1000,
+            "p99": percentile(latencies, 0.99) * 1000,
+        },
+        "peak_bytes": peak_bytes,
+        "retained_blocks": sum(stat.count for stat in snapshot.statistics("filename")),
+    }
+
+
+def run_benchmark(engines=None, workloads=None, scale=1000, repeat=5) -> dict:
+    """Runs benchmark workloads against execution engines.
+
+    :param engines: Engine names, defaults to all engines and "uvsim"
+    :param workloads: Workload names, defaults to all workloads
+    :param scale: Loop iteration count for synthetic workloads
+    :param repeat: Number of timed runs per engine and workload
+    :return report: Machine-readable benchmark report
+    """
+    engines = engines or [*UVSimController.ENGINES, "uvsim"]
+    available = make_workloads(scale)
+    results = []
+    for name in workloads or available:
+        program, value = available[name]
+        steps = count_steps(program, value)
+        for engine in engines:
+            result = measure(engine, program, value, steps, repeat)
+            results.append({"workload": name, **result})
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "scale": scale,
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def main():
+    """Main script driver."""
+    parser = argparse.ArgumentParser(description="Benchmark UVSim engines.")
+    parser.add_argument("--engine", action="append", dest="engines")
+    parser.add_argument("--workload", action="append", dest="workloads")
+    parser.add_argument("--scale", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Write JSON report to file")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.engines, args.workloads, args.scale, args.repeat)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f_out:
+            f_out.write(text + "\n")
+    else:
+        sys.stdout.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,11 +3,30 @@
 This module manages the controller components.
 """
 
+import asyncio
+import inspect
+import sys
+import time
+from typing import NamedTuple
+
+from fusion import WINDOW, fuse_cell
+from jit import BlockCache
 from model import DataModel
+from replay import IOEvent, IORecording, ReplayIO
+from tracing import KINDS, UNCHANGED
+from uvb import pack_checkpoint, unpack_checkpoint
+
+CHECK_INTERVAL = 1024
 
 
 class ArithmeticController:
-    """Manager for arithmetic operations."""
+    """Manager for arithmetic operations.
+
+    MULTIPLY and DIVIDE results are reduced modulo word_modulus, one word of
+    a two-digit operation code and its operand digits.
+    """
+
+    word_modulus = 10000
 
     def addition(self, accumulator, instruction_set, instruction_idx) -> int:
         """Adds designated memory value to accumulator.
@@ -40,7 +59,7 @@ class ArithmeticController:
         if not isinstance(instruction_set[instruction_idx], (int, float)):
             raise ValueError("Invalid instruction_idx: must be a number")
         result = accumulator * instruction_set[instruction_idx]
-        return result % 10000
+        return result % self.word_modulus
 
     def division(self, accumulator, instruction_set, instruction_idx) -> int:
         """Divides accumulator by designated memory value.
@@ -55,19 +74,23 @@ class ArithmeticController:
         if instruction_set[instruction_idx] == 00:
             raise ValueError("Invalid instruction_idx: Cannot divide by 0")
         else:
-            return (accumulator // instruction_set[instruction_idx]) % 10000
+            return (
+                accumulator // instruction_set[instruction_idx]
+            ) % self.word_modulus
 
 
 class BranchController:
     """Manager for branch operations."""
 
+    memory_size = 100
+
     def branch(self, instruction_idx) -> int:
         """Sets runtime cursor to new position.
 
         :param instruction_idx: Instruction index in memory
         :return cursor: New position in instruction set runtime
         """
-        if -2 < instruction_idx and instruction_idx < 100:
+        if -2 < instruction_idx and instruction_idx < self.memory_size:
             cursor = instruction_idx - 1
         else:
             raise IndexError(f"Memory index '{instruction_idx}' not in range.")
@@ -82,7 +105,7 @@ class BranchController:
         :return cursor: New position in instruction set runtime
         """
         if accumulator == 0:
-            if -2 < instruction_idx and instruction_idx < 100:
+            if -2 < instruction_idx and instruction_idx < self.memory_size:
                 cursor = instruction_idx - 1
             else:
                 raise IndexError(f"Memory index '{instruction_idx}' not in range.")
@@ -97,7 +120,7 @@ class BranchController:
         :return cursor: New position in instruction set runtime
         """
         if accumulator < 0:
-            if -2 < instruction_idx and instruction_idx < 100:
+            if -2 < instruction_idx and instruction_idx < self.memory_size:
                 cursor = instruction_idx - 1
             else:
                 raise IndexError(f"Memory index '{instruction_idx}' not in range.")
@@ -120,21 +143,78 @@ class BranchController:
             return cursor
 
 
+class RunResult(NamedTuple):
+    """Outcome of a program run.
+
+    status is one of "halted", "invalid", "budget_exceeded",
+    "deadline_exceeded", "loop_detected", "watchpoint", "input_required" or
+    "output".
+    """
+
+    status: str
+    steps: int
+    cursor: int
+    accumulator: int
+
+
+class Watchpoint(NamedTuple):
+    """Watched memory address range.
+
+    mode holds "r" to watch reads, "w" to watch writes, or both.
+    """
+
+    start: int
+    stop: int
+    mode: str
+    callback: object
+
+
+class WatchHit(NamedTuple):
+    """Watched memory access reported to a watchpoint callback."""
+
+    step: int
+    cursor: int
+    address: int
+    kind: str
+    old: int
+    new: int
+
+
 class UVSimController(ArithmeticController, BranchController):
     """Manager for application runtime."""
 
-    def __init__(self, halted=None, display_values=None):
+    ENGINES = {
+        "match": "execute_match",
+        "table": "execute_table",
+        "threaded": "execute_threaded",
+        "jit": "execute_jit",
+        "fused": "execute_fused",
+    }
+
+    def __init__(
+        self, halted=None, display_values=None, engine="match", data_model=None
+    ):
         """UVSimController initializer.
 
         :param halted: Halted callback function for ui
         :param display_values: Display value callback function for ui
+        :param engine: Default execution engine name from ENGINES
+        :param data_model: Data model instance, defaults to a new DataModel
         :return: None
         """
         super().__init__()
-        self.data_model = DataModel()
+        self.data_model = DataModel() if data_model is None else data_model
+        self.memory_size = len(self.data_model.memory)
+        self.operand_base = self.data_model.operand_base
+        self.word_modulus = self.operand_base * 100
         self.display_values = display_values
+        self.engine = engine
         self.cursor = 0
         self.instruction = 0
+        self.reads = 0
+        self.writes = 0
+        self.steps = 0
+        self.watchpoints = {}
         self.halted = halted
 
     def reset_accumulator(self) -> None:
@@ -161,6 +241,17 @@ class UVSimController(ArithmeticController, BranchController):
         """
         self.instruction = 0
 
+    def reset_io(self) -> None:
+        """Resets counts of consumed READ inputs, produced WRITE outputs and
+        executed steps.
+
+        :param: None
+        :return: None
+        """
+        self.reads = 0
+        self.writes = 0
+        self.steps = 0
+
     def load_program(self, filename) -> None:
         """Requests data model program load from file
 
@@ -168,6 +259,124 @@ class UVSimController(ArithmeticController, BranchController):
         :return: None
         """
         self.data_model.load_program(filename)
+        self.data_model.snapshot()
+
+    def restore_program(self) -> None:
+        """Requests data model restore of the loaded program and resets runtime.
+
+        :param: None
+        :return: None
+        """
+        self.data_model.restore()
+        self.reset_cursor()
+        self.reset_instruction()
+        self.reset_io()
+
+    def checkpoint(self, compress=False) -> bytes:
+        """Serializes memory, registers and I/O position of the run.
+
+        A run paused by execute_bounded can be checkpointed and resumed later,
+        in this or another controller, by restore_checkpoint. reads and
+        writes record how far into its input and output streams it got.
+
+        :param compress: Whether to zlib-compress the memory words
+        :return blob: Checkpoint bytes
+        """
+        return pack_checkpoint(
+            self.data_model.memory,
+            self.operand_base,
+            self.data_model.accumulator,
+            self.cursor,
+            self.instruction,
+            self.reads,
+            self.writes,
+            compress,
+        )
+
+    def restore_checkpoint(self, blob) -> None:
+        """Restores memory, registers and I/O position from a checkpoint.
+
+        :param blob: Checkpoint bytes from checkpoint
+        :return: None
+        """
+        state = unpack_checkpoint(blob)
+        if len(state.memory) != self.memory_size:
+            raise ValueError(
+                f"Checkpoint targets {len(state.memory)} memory words, "
+                f"not {self.memory_size}."
+            )
+        if state.operand_base != self.operand_base:
+            raise ValueError(
+                f"Checkpoint operand base {state.operand_base} does not match "
+                f"{self.operand_base}."
+            )
+        data_model = self.data_model
+        data_model.write_image(state.memory)
+        data_model.discard_caches()
+        data_model.accumulator = state.accumulator
+        self.cursor = state.cursor
+        self.instruction = state.instruction
+        self.reads = state.reads
+        self.writes = state.writes
+
+    def add_watchpoint(self, start: int, stop=None, mode="w", callback=None) -> int:
+        """Watches reads and/or writes of a memory address range.
+
+        callback receives a WatchHit after each watched access; the run stops
+        with status "watchpoint" when it returns a true value, or after the
+        access if there is no callback. Runs with watchpoints use the table
+        engine with instrumented handlers; without any, no engine is touched.
+
+        :param start: First watched memory index
+        :param stop: Index after the last watched one, defaults to start + 1
+        :param mode: "r", "w" or "rw"
+        :param callback: Hit callback function, or None to stop on every hit
+        :return watch_id: Identifier for remove_watchpoint
+        """
+        stop = start + 1 if stop is None else stop
+        if not 0 <= start < stop <= self.memory_size:
+            raise IndexError(f"Memory range '{start}:{stop}' not in range.")
+        if not mode or set(mode) - set("rw"):
+            raise ValueError(f"Invalid watchpoint mode '{mode}'")
+        watch_id = max(self.watchpoints, default=-1) + 1
+        self.watchpoints[watch_id] = Watchpoint(start, stop, mode, callback)
+        return watch_id
+
+    def remove_watchpoint(self, watch_id: int) -> None:
+        """Removes a watchpoint.
+
+        :param watch_id: Identifier returned by add_watchpoint
+        :return: None
+        """
+        del self.watchpoints[watch_id]
+
+    def clear_watchpoints(self) -> None:
+        """Removes every watchpoint.
+
+        :param: None
+        :return: None
+        """
+        self.watchpoints.clear()
+
+    def count_io(self, read_from_user, write_to_console) -> tuple:
+        """Wraps I/O callbacks to count consumed inputs and produced outputs.
+
+        :param read_from_user: Input callback function for ui
+        :param write_to_console: Output  callback function for ui
+        :return read, write: Counting input and output callbacks
+        """
+
+        def read():
+            value = read_from_user()
+            if value is not None:
+                self.reads += 1
+            return value
+
+        def write(value):
+            write_to_console(value)
+            self.writes += 1
+
+        return read, write
 
     def get_program_text(self) -> str:
         """Requests and formats instruction set from data model.
@@ -177,9 +386,10 @@ class UVSimController(ArithmeticController, BranchController):
         """
         program_text = ""
         instruction_set = self.data_model.get_instructions()
+        width = len(str(self.memory_size - 1))
 
         for i, val in enumerate(instruction_set):
-            idx, val = str(i).rjust(2, "0"), (
+            idx, val = str(i).rjust(width, "0"), (
                 val if "-" in str(val) else "+" + str(val)
             )
             program_text += f"{idx}:   {val}\n"
@@ -193,17 +403,61 @@ class UVSimController(ArithmeticController, BranchController):
         """
         return f"{self.data_model.get_accumulator()}\n", f"{self.cursor}\n"
 
-    def execute_program(self, read_from_user, write_to_console) -> None:
+    def execute_program(
+        self, read_from_user, write_to_console, engine=None, record=None, replay=None
+    ) -> None:
+        """Executes program with the requested execution engine.
+
+        With record, every READ input and WRITE output is logged with its
+        step number. With replay, inputs are fed from a recording instead of
+        the ui callbacks, and every output and the step of every READ and
+        WRITE are checked against it, raising ValueError on the first
+        divergence. Both run on the fused table engine, which counts steps.
+
+        :param read_from_user: Input callback function for ui
+        :param write_to_console: Output  callback function for ui
+        :param engine: Execution engine name from ENGINES, defaults to self.engine
+        :param record: IORecording extended with the run's I/O
+        :param replay: IORecording of the run to reproduce
+        :return: None
+        """
+        if record is not None or replay is not None:
+            if record is not None and replay is not None:
+                raise ValueError("Cannot record and replay the same run")
+            if engine not in (None, "table", "fused"):
+                raise ValueError(
+                    f"Record and replay run on the table engine, not '{engine}'"
+                )
+        if record is not None:
+            return self.execute_table(
+                read_from_user, write_to_console, fuse=True, recording=record
+            )
+        if replay is not None:
+            player, log = ReplayIO(replay), IORecording()
+            result = self.execute_table(
+                player.read_from_user, player.write_to_console, fuse=True, recording=log
+            )
+            player.finish(log)
+            return result
+        engine = getattr(
+            self, self.ENGINES["table" if self.watchpoints else engine or self.engine]
+        )
+        return engine(read_from_user, write_to_console)
+
+    def execute_match(self, read_from_user, write_to_console) -> None:
         """Executes main runtime loop and instruction validation.
 
         :param read_from_user: Input callback function for ui
         :param write_to_console: Output  callback function for ui
         :return: None
         """
+        read_from_user, write_to_console = self.count_io(
+            read_from_user, write_to_console
+        )
         while True:
             self.instruction = self.data_model.get_instruction(self.cursor)
-            operation_code = abs(self.instruction) // 100
-            instruction_idx = abs(self.instruction) % 100
+            operation_code = abs(self.instruction) // self.operand_base
+            instruction_idx = abs(self.instruction) % self.operand_base
 
             if self.display_values:
                 self.display_values(
@@ -256,7 +510,7 @@ class UVSimController(ArithmeticController, BranchController):
                         )
                     )
                 case 40:
-                    self.cursor = self.branch(instruction_idx, self.cursor)
+                    self.cursor = self.branch(instruction_idx)
                 case 41:
                     self.cursor = self.branch_negative(
                         self.cursor, self.data_model.get_accumulator(), instruction_idx
@@ -276,3 +530,860 @@ class UVSimController(ArithmeticController, BranchController):
                     break
 
             self.cursor += 1
+
+    def execute_bounded(
+        self,
+        read_from_user,
+        write_to_console,
+        max_steps=None,
+        timeout=None,
+        detect_loops=False,
+        recorder=None,
+        recording=None,
+        fuse=True,
+    ) -> RunResult:
+        """Executes table runtime loop within a step budget and timeout.
+
+        A run stopped by its budget or timeout leaves the cursor on the next
+        instruction, so calling again resumes where it stopped. Fusion pays a
+        scan of memory the first time a program runs, so callers running many
+        short freshly loaded programs should pass fuse=False.
+
+        :param read_from_user: Input callback function for ui
+        :param write_to_console: Output  callback function for ui
+        :param max_steps: Maximum number of instructions to execute
+        :param timeout: Maximum wall-clock seconds for the run
+        :param detect_loops: Whether to stop provably non-terminating runs
+        :param recorder: TraceRecorder extended with every executed step
+        :param recording: IORecording extended with every READ and WRITE
+        :param fuse: Whether to dispatch fused superinstructions
+        :return result: Run status, step count and final registers
+        """
+        return self.execute_table(
+            read_from_user,
+            write_to_console,
+            fuse=fuse,
+            max_steps=max_steps,
+            timeout=timeout,
+            detect_loops=detect_loops,
+            recorder=recorder,
+            recording=recording,
+        )
+
+    def execute_headless(
+        self, read_from_user, write_to_console, sample_every=0, engine="jit"
+    ) -> None:
+        """Executes program without per-step display callbacks.
+
+        display_values receives the final state once the run ends and, when
+        sample_every is set, every sample_every-th step through the table
+        engine. No per-step formatting is done otherwise.
+
+        :param read_from_user: Input callback function for ui
+        :param write_to_console: Output  callback function for ui
+        :param sample_every: Steps between display samples, 0 for final only
+        :param engine: Execution engine name from ENGINES when not sampling
+        :return: None
+        """
+        display_values = self.display_values
+        if sample_every:
+            self.execute_table(
+                read_from_user, write_to_console, sample_every=sample_every
+            )
+        else:
+            self.display_values = None
+            try:
+                self.execute_program(read_from_user, write_to_console, engine)
+            finally:
+                self.display_values = display_values
+        if display_values:
+            display_values(*self.get_acc_cur())
+
+    def execute_resumable(self, quantum=None):
+        """Executes program as a generator suspended at every READ and WRITE.
+
+        Yields IOEvent values: "read" expects the input to be sent back,
+        "write" carries the output, and with quantum "pause" marks every
+        quantum steps of compute. All run state stays in the controller and
+        data model between events, so a scheduler can interleave any number
+        of runs in one thread. Runs are not fused, so resuming only rebuilds
+        the dispatch table. The RunResult is the generator's return value.
+
+        :param quantum: Steps between "pause" events, None for I/O only
+        :return: Generator of IOEvent returning the RunResult
+        """
+        inputs = []
+        outputs = []
+        steps = 0
+        while True:
+            result = self.execute_table(
+                lambda: inputs.pop() if inputs else None,
+                outputs.append,
+                max_steps=quantum,
+                suspend_io=True,
+            )
+            steps += result.steps
+            if result.status == "input_required":
+                value = yield IOEvent(steps, "read", None)
+                if value is None:
+                    raise ValueError("Invalid input: READ received no value")
+                inputs.append(value)
+            elif result.status == "output":
+                yield IOEvent(steps - 1, "write", outputs.pop())
+            elif result.status == "budget_exceeded":
+                yield IOEvent(steps, "pause", None)
+            else:
+                return result._replace(steps=steps)
+
+    async def execute_async(
+        self, read_from_user, write_to_console, quantum=None
+    ) -> RunResult:
+        """Executes program with awaitable I/O callbacks.
+
+        Compute between I/O runs in the table loop without awaits, unfused
+        like every execute_resumable run; the run suspends at each READ and
+        WRITE through execute_resumable, awaits the callback and resumes.
+        With quantum, long compute stretches also yield to the event loop
+        every quantum steps so other sessions keep running.
+
+        :param read_from_user: Input coroutine function, or plain function
+        :param write_to_console: Output coroutine function, or plain function
+        :param quantum: Steps between event loop yields, None for I/O only
+        :return result: Run status, total step count and final registers
+        """
+        run = self.execute_resumable(quantum)
+        value = None
+        while True:
+            try:
+                event = run.send(value)
+            except StopIteration as stop:
+                return stop.value
+            value = None
+            if event.kind == "read":
+                value = read_from_user()
+                value = await value if inspect.isawaitable(value) else value
+            elif event.kind == "write":
+                written = write_to_console(event.value)
+                if inspect.isawaitable(written):
+                    await written
+            else:
+                await asyncio.sleep(0)
+
+    def execute_fused(self, read_from_user, write_to_console) -> None:
+        """Executes table runtime loop with fused superinstructions.
+
+        :param read_from_user: Input callback function for ui
+        :param write_to_console: Output  callback function for ui
+        :return: None
+        """
+        return self.execute_table(read_from_user, write_to_console, fuse=True)
+
+    def replay_step(self, memory, cursor: int, acc: int) -> tuple[int, int]:
+        """Executes one instruction of a READ-free stretch on a memory copy.
+
+        WRITE produces no output, so a stretch can be replayed without
+        repeating its side effects.
+
+        :param memory: Main memory words, updated in place
+        :param cursor: Position of the instruction to execute
+        :param acc: Value in accumulator register
+        :return cursor, acc: Next position and accumulator value
+        """
+        operation_code, operand = divmod(abs(memory[cursor]), self.operand_base)
+        if operation_code == 20:
+            acc = memory[operand]
+        elif operation_code == 21:
+            memory[operand] = acc
+        elif operation_code == 30:
+            acc = acc + memory[operand]
+        elif operation_code == 31:
+            acc = acc - memory[operand]
+        elif operation_code == 32:
+            acc = self.division(acc, memory, operand)
+        elif operation_code == 33:
+            acc = self.multiplication(acc, memory, operand)
+        elif operation_code == 40:
+            return operand, acc
+        elif operation_code == 41 and acc < 0:
+            return operand, acc
+        elif operation_code == 42 and acc == 0:
+            return operand, acc
+        elif operation_code not in (11, 41, 42):
+            raise ValueError(f"Invalid replay of operation code '{operation_code}'")
+        return cursor + 1, acc
+
+    def find_loop_entry(self, cursor: int, acc: int, memory, period: int) -> tuple:
+        """Finds the first state of a cycle (second pass of Brent's method).
+
+        One copy of the machine is run period steps ahead of another from the
+        given state, then both advance together until their states match.
+
+        :param cursor: Position at the start of the READ-free stretch
+        :param acc: Value in accumulator register at the start
+        :param memory: Main memory words at the start, left unchanged
+        :param period: Number of steps in the cycle
+        :return cursor, acc, memory: First state that repeats
+        """
+        lead, trail = list(memory), list(memory)
+        lead_cursor, lead_acc = cursor, acc
+        for _ in range(period):
+            lead_cursor, lead_acc = self.replay_step(lead, lead_cursor, lead_acc)
+        while (cursor, acc) != (lead_cursor, lead_acc) or trail != lead:
+            cursor, acc = self.replay_step(trail, cursor, acc)
+            lead_cursor, lead_acc = self.replay_step(lead, lead_cursor, lead_acc)
+        return cursor, acc, trail
+
+    def execute_table(
+        self,
+        read_from_user,
+        write_to_console,
+        fuse=False,
+        sample_every=1,
+        max_steps=None,
+        timeout=None,
+        detect_loops=False,
+        recorder=None,
+        recording=None,
+        suspend_io=False,
+    ) -> RunResult:
+        """Executes runtime loop through a prebuilt opcode dispatch table.
+
+        Accumulator and cursor are held in local registers for the run and
+        written back to the data model and controller when it ends. With fuse,
+        common instruction sequences found by fuse_cell run as one dispatch
+        unless display_values requests every step. A cell is scanned when the
+        run first reaches it and the result is cached on the data model, so
+        setup work scales with the cells a run executes rather than with
+        memory size. Step budget and timeout are only checked every
+        CHECK_INTERVAL steps.
+
+        With detect_loops, the (cursor, accumulator, memory) state is saved at
+        exponentially spaced steps (Brent's method) and compared each step
+        using the data model memory fingerprint. A repeat with no READ in
+        between can never halt, so the run stops with "loop_detected". The
+        stretch since the last READ is then replayed by find_loop_entry and
+        the machine is rewound to the first state that repeats, so cursor,
+        accumulator and memory describe the loop entry; steps still counts
+        every executed step.
+
+        With suspend_io, a READ whose callback returns None stops the run
+        with status "input_required" and the cursor on the READ, and every
+        WRITE stops it with status "output" after the write, so a caller can
+        wait for I/O outside the loop and call again to resume.
+
+        With recorder, every executed step is appended to the TraceRecorder
+        through wrapped handlers and fusion is disabled, so the dispatch loop
+        is unchanged when no trace is taken. An invalid operation code is
+        recorded as an unchanged step, so the trace length always equals the
+        step count. recording is extended the same way with READ and WRITE
+        values and their step numbers.
+
+        The step count is also stored in self.steps, which is how callers
+        learn how many steps a run took when a handler raises; the faulting
+        step is included.
+
+        :param read_from_user: Input callback function for ui
+        :param write_to_console: Output  callback function for ui
+        :param fuse: Whether to dispatch fused superinstructions
+        :param sample_every: Steps between display_values callbacks
+        :param max_steps: Maximum number of instructions to execute
+        :param timeout: Maximum wall-clock seconds for the run
+        :param detect_loops: Whether to stop provably non-terminating runs
+        :param recorder: TraceRecorder extended with every executed step
+        :param recording: IORecording extended with every READ and WRITE
+        :param suspend_io: Whether to stop at READ and after WRITE
+        :return result: Run status, step count and final registers
+        """
+        read_from_user, write_to_console = self.count_io(
+            read_from_user, write_to_console
+        )
+        data_model = self.data_model
+        memory = data_model.memory
+        decoded = data_model.decoded
+        rescan = data_model.rescan
+        journal = data_model.journal
+        get_decoded = data_model.get_decoded
+        display_values = self.display_values
+        division, multiplication = self.division, self.multiplication
+        acc = data_model.accumulator
+        cursor = fetched = self.cursor
+        countdown = 1
+        memory_hash = data_model.get_memory_hash() if detect_loops else None
+        data_model.memory_hash = None
+        saved, saved_memory, power = None, None, 1
+        origin, saved_step = None, 0
+
+        def sync() -> None:
+            data_model.accumulator = acc
+            self.cursor = cursor
+            self.instruction = memory[fetched]
+            data_model.memory_hash = memory_hash
+
+        def unfuse(idx) -> None:
+            for start in range(max(idx - WINDOW + 1, 0), idx + 1):
+                superops.pop(start, None)
+            covered.discard(idx)
+
+        def suspend() -> bool:
+            nonlocal status, remaining
+            status = "input_required"
+            remaining += 1
+            return True
+
+        def output() -> bool:
+            nonlocal status, cursor
+            status = "output"
+            cursor += 1
+            return True
+
+        def read(operand):
+            value = read_from_user()
+            if value is None and suspend_io:
+                return suspend()
+            if journal is not None and operand not in journal:
+                journal[operand] = memory[operand]
+            memory[operand] = value
+            decoded[operand] = None
+            rescan[operand] = True
+            if operand in covered:
+                unfuse(operand)
+
+        def write(operand):
+            write_to_console(memory[operand])
+            if suspend_io:
+                return output()
+
+        def load(operand):
+            nonlocal acc
+            acc = memory[operand]
+
+        def store(operand):
+            if journal is not None and operand not in journal:
+                journal[operand] = memory[operand]
+            memory[operand] = acc
+            decoded[operand] = None
+            rescan[operand] = True
+            if operand in covered:
+                unfuse(operand)
+
+        def add(operand):
+            nonlocal acc
+            acc = acc + memory[operand]
+
+        def subtract(operand):
+            nonlocal acc
+            acc = acc - memory[operand]
+
+        def divide(operand):
+            nonlocal acc
+            acc = division(acc, memory, operand)
+
+        def multiply(operand):
+            nonlocal acc
+            acc = multiplication(acc, memory, operand)
+
+        def branch(operand):
+            nonlocal cursor
+            cursor = operand - 1
+
+        def branch_negative(operand):
+            nonlocal cursor
+            if acc < 0:
+                cursor = operand - 1
+
+        def branch_zero(operand):
+            nonlocal cursor
+            if acc == 0:
+                cursor = operand - 1
+
+        def halt(operand):
+            nonlocal cursor
+            sync()
+            cursor = self.halt(self.halted, operand)
+            return True
+
+        table = {
+            10: read,
+            11: write,
+            20: load,
+            21: store,
+            30: add,
+            31: subtract,
+            32: divide,
+            33: multiply,
+            40: branch,
+            41: branch_negative,
+            42: branch_zero,
+            43: halt,
+        }
+
+        def read_hashed(operand):
+            nonlocal memory_hash, saved, power, probe
+            value = read_from_user()
+            if value is None and suspend_io:
+                return suspend()
+            if journal is not None and operand not in journal:
+                journal[operand] = memory[operand]
+            memory_hash ^= hash((operand, memory[operand])) ^ hash((operand, value))
+            memory[operand] = value
+            decoded[operand] = None
+            rescan[operand] = True
+            saved, power, probe = None, 1, 0
+
+        def rewind() -> None:
+            nonlocal cursor, acc, fetched, memory_hash
+            period = granted - remaining - saved_step
+            cursor, acc, entry = self.find_loop_entry(*origin, period)
+            for idx, value in enumerate(entry):
+                if memory[idx] != value:
+                    if journal is not None and idx not in journal:
+                        journal[idx] = memory[idx]
+                    memory[idx] = value
+                    decoded[idx] = None
+                    rescan[idx] = True
+            fetched = cursor
+            memory_hash = None
+
+        def store_hashed(operand):
+            nonlocal memory_hash
+            if journal is not None and operand not in journal:
+                journal[operand] = memory[operand]
+            memory_hash ^= hash((operand, memory[operand])) ^ hash((operand, acc))
+            memory[operand] = acc
+            decoded[operand] = None
+            rescan[operand] = True
+
+        if detect_loops:
+            table[10], table[21] = read_hashed, store_hashed
+
+        def notify(watchers, kind, operand, old, stopped) -> bool:
+            nonlocal status, cursor
+            hit = WatchHit(
+                granted - remaining - 1,
+                fetched,
+                operand,
+                kind,
+                old,
+                memory[operand],
+            )
+            stop = False
+            for watchpoint in watchers:
+                if watchpoint.callback is None or watchpoint.callback(hit):
+                    stop = True
+            if stop and not stopped:
+                status = "watchpoint"
+                cursor += 1
+            return stop or stopped
+
+        def watched(handler, kind, watches):
+            def op(operand):
+                watchers = watches[operand]
+                if not watchers:
+                    return handler(operand)
+                old = memory[operand]
+                stopped = handler(operand)
+                if status == "input_required":
+                    return stopped
+                return notify(watchers, kind, operand, old, stopped)
+
+            return op
+
+        if self.watchpoints:
+            watches = {"r": [()] * len(memory), "w": [()] * len(memory)}
+            for watchpoint in self.watchpoints.values():
+                for mode in set(watchpoint.mode):
+                    for idx in range(watchpoint.start, watchpoint.stop):
+                        watches[mode][idx] += (watchpoint,)
+            for operation_code in (11, 20, 30, 31, 32, 33):
+                table[operation_code] = watched(
+                    table[operation_code], "read", watches["r"]
+                )
+            for operation_code in (10, 21):
+                table[operation_code] = watched(
+                    table[operation_code], "write", watches["w"]
+                )
+
+        def logged(handler, log):
+            def op(operand):
+                stopped = handler(operand)
+                if status != "input_required":
+                    log(base + granted - remaining - 1, memory[operand])
+                return stopped
+
+            return op
+
+        if recording is not None:
+            base = recording.steps
+            table[10] = logged(table[10], recording.record_read)
+            table[11] = logged(table[11], recording.record_write)
+
+        def traced(handler, kind):
+            def op(operand):
+                stopped = handler(operand)
+                if status != "input_required":
+                    record(fetched, kind, operand, acc, memory)
+                return stopped
+
+            return op
+
+        if recorder is not None:
+            recorder.start(memory, acc)
+            record = recorder.record
+            for operation_code, handler in table.items():
+                table[operation_code] = traced(
+                    handler, KINDS.get(operation_code, UNCHANGED)
+                )
+        get_handler = table.get
+
+        def make_superop(idx):
+            pattern = fuse_cell(data_model, idx)
+            if not pattern:
+                return False
+            name, operands = pattern
+            covered.update(range(idx, idx + len(operands)))
+            if name in ("load_add_store", "load_subtract_store"):
+                source, other, target = operands
+                subtract = name == "load_subtract_store"
+                successor = idx + 3
+
+                def superop():
+                    nonlocal acc
+                    if subtract:
+                        acc = memory[source] - memory[other]
+                    else:
+                        acc = memory[source] + memory[other]
+                    if journal is not None and target not in journal:
+                        journal[target] = memory[target]
+                    memory[target] = acc
+                    decoded[target] = None
+                    rescan[target] = True
+                    if target in covered:
+                        unfuse(target)
+                    return successor
+
+            else:
+                source, target = operands
+                negative = name == "load_branch_negative"
+                successor = idx + 2
+
+                def superop():
+                    nonlocal acc
+                    acc = memory[source]
+                    if (acc < 0) if negative else (acc == 0):
+                        return target
+                    return successor
+
+            return superop, len(operands)
+
+        superops, covered = {}, set()
+        instrumented = recorder is not None or self.watchpoints
+        fusing = fuse and not display_values and not detect_loops and not instrumented
+
+        status = "halted"
+        remaining = granted = probe = 0
+        if timeout is not None:
+            deadline = time.monotonic() + timeout
+
+        def refill() -> int:
+            nonlocal status, granted
+            grant = sys.maxsize
+            if max_steps is not None:
+                grant = min(CHECK_INTERVAL, max_steps - granted)
+                if grant <= 0:
+                    status = "budget_exceeded"
+                    return 0
+            if timeout is not None:
+                grant = min(grant, CHECK_INTERVAL)
+                if time.monotonic() >= deadline:
+                    status = "deadline_exceeded"
+                    return 0
+            granted += grant
+            return grant
+
+        try:
+            while True:
+                if not remaining:
+                    remaining = refill()
+                    if not remaining:
+                        break
+
+                if detect_loops:
+                    if (cursor, acc, memory_hash) == saved and memory == saved_memory:
+                        status = "loop_detected"
+                        rewind()
+                        break
+                    probe -= 1
+                    if probe <= 0:
+                        power *= 2
+                        probe = power
+                        saved, saved_memory = (cursor, acc, memory_hash), memory[:]
+                        saved_step = granted - remaining
+                        if power == 2:
+                            # First save since the run start or the last READ.
+                            origin = (cursor, acc, saved_memory)
+
+                if fusing:
+                    entry = superops.get(cursor)
+                    if entry is None:
+                        entry = superops[cursor] = make_superop(cursor)
+                    if entry and remaining >= WINDOW:
+                        superop, size = entry
+                        remaining -= size
+                        cursor = superop()
+                        continue
+
+                operation_code, instruction_idx = (
+                    decoded[cursor] or get_decoded(cursor)
+                )
+                fetched = cursor
+                remaining -= 1
+
+                if display_values:
+                    countdown -= 1
+                    if not countdown:
+                        countdown = sample_every
+                        sync()
+                        display_values(f"{acc}\n", f"{cursor}\n")
+
+                handler = get_handler(operation_code)
+                if handler is None:
+                    print(
+                        f"Invalid operation code '{operation_code}'. \n"
+                        "Program terminated"
+                    )
+                    if recorder is not None:
+                        record(fetched, UNCHANGED, instruction_idx, acc, memory)
+                    status = "invalid"
+                    break
+                if handler(instruction_idx):
+                    break
+                cursor += 1
+        finally:
+            sync()
+            self.steps = granted - remaining
+            if recording is not None:
+                recording.steps = base + self.steps
+        return RunResult(status, granted - remaining, self.cursor, acc)
+
+    def execute_threaded(self, read_from_user, write_to_console) -> None:
+        """Executes runtime loop over closure-threaded code.
+
+        Each memory cell is compiled on first use into a closure with its
+        operand and successor baked in that returns the next cursor. Cells
+        written by READ or STORE are recompiled lazily on their next use.
+
+        :param read_from_user: Input callback function for ui
+        :param write_to_console: Output  callback function for ui
+        :return: None
+        """
+        read_from_user, write_to_console = self.count_io(
+            read_from_user, write_to_console
+        )
+        data_model = self.data_model
+        memory = data_model.memory
+        decoded = data_model.decoded
+        rescan = data_model.rescan
+        journal = data_model.journal
+        get_decoded = data_model.get_decoded
+        display_values = self.display_values
+        division, multiplication = self.division, self.multiplication
+        acc = data_model.accumulator
+        pc = self.cursor
+        data_model.memory_hash = None
+
+        def sync(cursor, fetched) -> None:
+            data_model.accumulator = acc
+            self.cursor = cursor
+            self.instruction = memory[fetched]
+
+        def compile_cell(idx):
+            operation_code, operand = decoded[idx] or get_decoded(idx)
+            successor = idx + 1
+
+            if operation_code == 10:
+
+                def op():
+                    value = read_from_user()
+                    if journal is not None and operand not in journal:
+                        journal[operand] = memory[operand]
+                    memory[operand] = value
+                    decoded[operand] = None
+                    rescan[operand] = True
+                    code[operand] = None
+                    return successor
+
+            elif operation_code == 11:
+
+                def op():
+                    write_to_console(memory[operand])
+                    return successor
+
+            elif operation_code == 20:
+
+                def op():
+                    nonlocal acc
+                    acc = memory[operand]
+                    return successor
+
+            elif operation_code == 21:
+
+                def op():
+                    if journal is not None and operand not in journal:
+                        journal[operand] = memory[operand]
+                    memory[operand] = acc
+                    decoded[operand] = None
+                    rescan[operand] = True
+                    code[operand] = None
+                    return successor
+
+            elif operation_code == 30:
+
+                def op():
+                    nonlocal acc
+                    acc = acc + memory[operand]
+                    return successor
+
+            elif operation_code == 31:
+
+                def op():
+                    nonlocal acc
+                    acc = acc - memory[operand]
+                    return successor
+
+            elif operation_code == 32:
+
+                def op():
+                    nonlocal acc
+                    acc = division(acc, memory, operand)
+                    return successor
+
+            elif operation_code == 33:
+
+                def op():
+                    nonlocal acc
+                    acc = multiplication(acc, memory, operand)
+                    return successor
+
+            elif operation_code == 40:
+
+                def op():
+                    return operand
+
+            elif operation_code == 41:
+
+                def op():
+                    return operand if acc < 0 else successor
+
+            elif operation_code == 42:
+
+                def op():
+                    return operand if acc == 0 else successor
+
+            elif operation_code == 43:
+
+                def op():
+                    sync(idx, idx)
+                    self.cursor = self.halt(self.halted, operand)
+
+            else:
+
+                def op():
+                    print(
+                        f"Invalid operation code '{operation_code}'. \n"
+                        "Program terminated"
+                    )
+                    sync(idx, idx)
+
+            if display_values:
+                execute = op
+
+                def op():
+                    sync(idx, idx)
+                    display_values(f"{acc}\n", f"{idx}\n")
+                    return execute()
+
+            code[idx] = op
+            return op
+
+        code = {}
+
+        try:
+            while pc is not None:
+                try:
+                    # None marks a cell written since it was compiled.
+                    op = code[pc] or compile_cell(pc)
+                except KeyError:
+                    op = compile_cell(pc)
+                pc = op()
+        except BaseException:
+            data_model.accumulator = acc
+            self.cursor = pc
+            if 0 <= pc < len(memory):
+                self.instruction = memory[pc]
+            raise
+
+    def execute_jit(self, read_from_user, write_to_console) -> None:
+        """Executes runtime loop over basic blocks compiled to Python bytecode.
+
+        Blocks are translated on first entry and discarded when READ or STORE
+        writes into their address range; cells rewritten repeatedly run one
+        instruction at a time instead, see BlockCache. Runs observed through
+        display_values fall back to the threaded engine, which reports every
+        step.
+
+        :param read_from_user: Input callback function for ui
+        :param write_to_console: Output  callback function for ui
+        :return: None
+        """
+        if self.display_values:
+            return self.execute_threaded(read_from_user, write_to_console)
+
+        read_from_user, write_to_console = self.count_io(
+            read_from_user, write_to_console
+        )
+        data_model = self.data_model
+        memory = data_model.memory
+        regs = [data_model.accumulator, self.cursor]
+        data_model.memory_hash = None
+
+        def sync(cursor, fetched) -> None:
+            data_model.accumulator = regs[0]
+            self.cursor = cursor
+            self.instruction = memory[fetched]
+
+        def halt(idx, operand):
+            sync(idx, idx)
+            self.cursor = self.halt(self.halted, operand)
+
+        def invalid(idx, operation_code):
+            print(f"Invalid operation code '{operation_code}'. \nProgram terminated")
+            sync(idx, idx)
+
+        cache = BlockCache(
+            data_model,
+            {
+                "regs": regs,
+                "read_from_user": read_from_user,
+                "write_to_console": write_to_console,
+                "division": self.division,
+                "multiplication": self.multiplication,
+                "halt": halt,
+                "invalid": invalid,
+            },
+        )
+        blocks, compile_block = cache.blocks, cache.compile_block
+        pc = self.cursor
+
+        try:
+            while pc is not None:
+                regs[1] = pc
+                try:
+                    block = blocks[pc] or compile_block(pc)
+                except KeyError:
+                    block = compile_block(pc)
+                pc = block()
+        except BaseException:
+            data_model.accumulator, self.cursor = regs
+            if 0 <= self.cursor < len(memory):
+                self.instruction = memory[self.cursor]
+            raise
@@ -0,0 +1,65 @@
+"""Fusion
+
+This module manages the superinstruction fusion components.
+"""
+
+PATTERNS = {
+    (20, 30, 21): "load_add_store",
+    (20, 31, 21): "load_subtract_store",
+    (20, 41): "load_branch_negative",
+    (20, 42): "load_branch_zero",
+}
+WINDOW = max(len(pattern) for pattern in PATTERNS)
+SIZES = sorted({len(pattern) for pattern in PATTERNS}, reverse=True)
+LEADERS = {pattern[0] for pattern in PATTERNS}
+
+
+def fuse_cell(data_model, idx: int):
+    """Finds the superinstruction pattern starting at a memory index.
+
+    Results are cached in data_model.fused, so each index is scanned once.
+    Writes add the written cell to data_model.rescan, and every cached
+    result whose pattern window covers such a cell is discarded here before
+    the cache is read.
+
+    :param data_model: Data model holding program memory
+    :param idx: Index value for main memory
+    :return fused: Pattern name and operands, or False
+    """
+    fused, rescan = data_model.fused, data_model.rescan
+    memory_size = len(data_model.memory)
+    end = min(idx + WINDOW, memory_size)
+    if rescan:
+        for cell in range(idx, end):
+            if cell in rescan:
+                del rescan[cell]
+                for start in range(max(cell - WINDOW + 1, 0), cell + 1):
+                    fused.pop(start, None)
+    entry = fused.get(idx)
+    if entry is not None:
+        return entry
+
+    entry = False
+    decoded, get_decoded = data_model.decoded, data_model.get_decoded
+    if (decoded[idx] or get_decoded(idx))[0] in LEADERS:
+        window = [decoded[cell] or get_decoded(cell) for cell in range(idx, end)]
+        codes = tuple(operation_code for operation_code, _ in window)
+        for size in SIZES:
+            name = PATTERNS.get(codes[:size])
+            if name is not None:
+                entry = (name, tuple(operand for _, operand in window[:size]))
+                break
+    fused[idx] = entry
+    return entry
+
+
+def fuse_program(data_model) -> list:
+    """Finds superinstruction patterns starting at each memory index.
+
+    Patterns may overlap, so a branch into the middle of one still lands on
+    the fused group that starts at its target, if any.
+
+    :param data_model: Data model holding program memory
+    :return fused: Pattern name and operands per memory index, or False
+    """
+    return [fuse_cell(data_model, idx) for idx in range(len(data_model.memory))]
@@ -0,0 +1,257 @@
+"""JIT
+
+This module manages the basic block compiler components.
+"""
+
+from functools import lru_cache
+
+OPERATIONS = (10, 11, 20, 21, 30, 31, 32, 33)
+REWRITE_LIMIT = 4
+BINDINGS = (
+    "memory",
+    "decoded",
+    "rescan",
+    "journal",
+    "owners",
+    "regs",
+    "invalidate",
+    "read_from_user",
+    "write_to_console",
+    "division",
+    "multiplication",
+    "halt",
+    "invalid",
+)
+
+
+@lru_cache(maxsize=4096)
+def compile_source(source: str):
+    """Compiles basic block source, shared across runs with identical blocks.
+
+    :param source: Python source defining a block factory
+    :return code: Code object for the block factory module
+    """
+    return compile(source, "<uvsim-jit>", "exec")
+
+
+def translate_block(data_model, start: int, boundaries=()) -> tuple[str, int]:
+    """Translates basic block beginning at memory index into Python source.
+
+    A block runs until BRANCH, BRANCHNEG, BRANCHZERO, HALT, an invalid
+    operation code, a write that lands later in the same block, or one of
+    the boundaries.
+
+    :param data_model: Data model holding program memory
+    :param start: Index value for main memory where the block begins
+    :param boundaries: Memory indexes a block may not extend into
+    :return source, end: Block factory source and last index in the block
+    """
+    memory_size = len(data_model.memory)
+    journaled = data_model.journal is not None
+    end = start
+    while (
+        end + 1 < memory_size
+        and end + 1 not in boundaries
+        and data_model.get_decoded(end)[0] in OPERATIONS
+    ):
+        end += 1
+
+    body = []
+    idx = start
+    while True:
+        operation_code, operand = data_model.get_decoded(idx)
+        body.append(f"pc = {idx}")
+        successor = idx + 1
+        match operation_code:
+            case 10 | 21:
+                value = "read_from_user()" if operation_code == 10 else "acc"
+                if journaled:
+                    body += [
+                        f"if {operand} not in journal:",
+                        f"    journal[{operand}] = memory[{operand}]",
+                    ]
+                body += [
+                    f"memory[{operand}] = {value}",
+                    f"decoded[{operand}] = None",
+                    f"rescan[{operand}] = True",
+                    f"if {operand} in owners:",
+                    f"    invalidate({operand})",
+                ]
+                if idx < operand <= end:
+                    body += ["regs[0] = acc", f"return {successor}"]
+                    break
+            case 11:
+                body.append(f"write_to_console(memory[{operand}])")
+            case 20:
+                body.append(f"acc = memory[{operand}]")
+            case 30:
+                body.append(f"acc = acc + memory[{operand}]")
+            case 31:
+                body.append(f"acc = acc - memory[{operand}]")
+            case 32:
+                body.append(f"acc = division(acc, memory, {operand})")
+            case 33:
+                body.append(f"acc = multiplication(acc, memory, {operand})")
+            case 40:
+                body += ["regs[0] = acc", f"return {operand}"]
+                break
+            case 41:
+                taken = f"return {operand} if acc < 0 else {successor}"
+                body += ["regs[0] = acc", taken]
+                break
+            case 42:
+                taken = f"return {operand} if acc == 0 else {successor}"
+                body += ["regs[0] = acc", taken]
+                break
+            case 43:
+                body += ["regs[0] = acc", f"return halt({idx}, {operand})"]
+                break
+            case _:
+                failed = f"return invalid({idx}, {operation_code})"
+                body += ["regs[0] = acc", failed]
+                break
+        if successor == memory_size or successor in boundaries:
+            body += ["regs[0] = acc", f"return {successor}"]
+            break
+        idx = successor
+
+    lines = [
+        f"def make({', '.join(BINDINGS)}):",
+        "    def block():",
+        "        acc = regs[0]",
+        "        try:",
+        *(f"            {line}" for line in body),
+        "        except BaseException:",
+        "            regs[0] = acc",
+        "            regs[1] = pc",
+        "            raise",
+        "    return block",
+    ]
+    return "\n".join(lines) + "\n", idx
+
+
+class BlockCache:
+    """Manager for compiled basic blocks of one program run.
+
+    A cell whose writes have discarded compiled code REWRITE_LIMIT times is
+    hot: blocks end before it and it runs through a single-instruction
+    block that decodes it on every call, so self-modifying loops stop
+    retranslating code on every iteration.
+    """
+
+    def __init__(self, data_model, bindings: dict):
+        """BlockCache initializer.
+
+        :param data_model: Data model holding program memory
+        :param bindings: Runtime objects referenced by generated blocks
+        :return: None
+        """
+        self.data_model = data_model
+        self.blocks = {}
+        self.ranges = {}
+        self.owners = {}
+        self.rewrites = {}
+        self.hot = set()
+        self.bindings = dict(
+            bindings,
+            memory=data_model.memory,
+            decoded=data_model.decoded,
+            rescan=data_model.rescan,
+            journal=data_model.journal,
+            owners=self.owners,
+            invalidate=self.invalidate,
+        )
+
+    def compile_block(self, start: int):
+        """Compiles and caches the basic block beginning at memory index.
+
+        :param start: Index value for main memory where the block begins
+        :return block: Callable running the block and returning next cursor
+        """
+        if start in self.hot:
+            block = self.blocks[start] = self.interpret_cell(start)
+            return block
+        source, end = translate_block(self.data_model, start, self.hot)
+        namespace = {}
+        exec(compile_source(source), namespace)
+        block = namespace["make"](**self.bindings)
+        self.blocks[start] = block
+        self.ranges[start] = end
+        for idx in range(start, end + 1):
+            self.owners.setdefault(idx, set()).add(start)
+        return block
+
+    def invalidate(self, idx: int) -> None:
+        """Discards compiled blocks covering specified memory index.
+
+        :param idx: Index value for main memory that was written
+        :return: None
+        """
+        rewrites = self.rewrites[idx] = self.rewrites.get(idx, 0) + 1
+        if rewrites == REWRITE_LIMIT:
+            self.hot.add(idx)
+        for start in self.owners.pop(idx, ()):
+            self.blocks[start] = None
+            for covered in range(start, self.ranges.pop(start) + 1):
+                starts = self.owners.get(covered)
+                if starts is not None:
+                    starts.discard(start)
+                    if not starts:
+                        del self.owners[covered]
+
+    def interpret_cell(self, idx: int):
+        """Builds a block running the single instruction at a memory index.
+
+        The instruction is decoded on every call, so the block stays valid
+        when the cell is written and is not registered as an owner.
+
+        :param idx: Index value for main memory
+        :return block: Callable running the instruction and returning next cursor
+        """
+        bindings = self.bindings
+        memory, decoded = bindings["memory"], bindings["decoded"]
+        rescan = bindings["rescan"]
+        journal, owners, regs = bindings["journal"], self.owners, bindings["regs"]
+        read_from_user = bindings["read_from_user"]
+        write_to_console = bindings["write_to_console"]
+        division, multiplication = bindings["division"], bindings["multiplication"]
+        halt, invalid = bindings["halt"], bindings["invalid"]
+        get_decoded = self.data_model.get_decoded
+        successor = idx + 1
+
+        def block():
+            operation_code, operand = decoded[idx] or get_decoded(idx)
+            if operation_code == 10 or operation_code == 21:
+                value = read_from_user() if operation_code == 10 else regs[0]
+                if journal is not None and operand not in journal:
+                    journal[operand] = memory[operand]
+                memory[operand] = value
+                decoded[operand] = None
+                rescan[operand] = True
+                if operand in owners:
+                    self.invalidate(operand)
+            elif operation_code == 11:
+                write_to_console(memory[operand])
+            elif operation_code == 20:
+                regs[0] = memory[operand]
+            elif operation_code == 30:
+                regs[0] = regs[0] + memory[operand]
+            elif operation_code == 31:
+                regs[0] = regs[0] - memory[operand]
+            elif operation_code == 32:
+                regs[0] = division(regs[0], memory, operand)
+            elif operation_code == 33:
+                regs[0] = multiplication(regs[0], memory, operand)
+            elif operation_code == 40:
+                return operand
+            elif operation_code == 41:
+                return operand if regs[0] < 0 else successor
+            elif operation_code == 42:
+                return operand if regs[0] == 0 else successor
+            elif operation_code == 43:
+                return halt(idx, operand)
+            else:
+                return invalid(idx, operation_code)
+            return successor
+
+        return block
@@ -0,0 +1,168 @@
+"""Replay
+
+This module manages the program I/O record and replay components.
+"""
+
+import json
+from typing import NamedTuple
+
+VERSION = 1
+
+
+class IOEvent(NamedTuple):
+    """READ input or WRITE output and the step that performed it.
+
+    Resumable runs also use kind "pause" for compute quantum boundaries.
+    """
+
+    step: int
+    kind: str
+    value: int
+
+
+class IORecording:
+    """Manager for the READ inputs and WRITE outputs of recorded runs."""
+
+    def __init__(self, events=(), steps: int = 0):
+        """IORecording initializer.
+
+        :param events: Recorded IOEvent values in run order
+        :param steps: Number of steps executed by the recorded runs
+        :return: None
+        """
+        self.events = [IOEvent(*event) for event in events]
+        self.steps = steps
+
+    def record_read(self, step: int, value: int) -> None:
+        """Logs a READ input.
+
+        :param step: Index of the step that read the value
+        :param value: Value returned by the input callback
+        :return: None
+        """
+        self.events.append(IOEvent(step, "read", value))
+
+    def record_write(self, step: int, value: int) -> None:
+        """Logs a WRITE output.
+
+        :param step: Index of the step that wrote the value
+        :param value: Value passed to the output callback
+        :return: None
+        """
+        self.events.append(IOEvent(step, "write", value))
+
+    def get_events(self, kind: str) -> list:
+        """Gets recorded events of one kind.
+
+        :param kind: "read" or "write"
+        :return events: IOEvent values in run order
+        """
+        return [event for event in self.events if event.kind == kind]
+
+    def save(self, filename: str) -> None:
+        """Saves recording to a JSON file.
+
+        :param filename: String containing file path
+        :return: None
+        """
+        with open(filename, "w") as f_out:
+            json.dump(
+                {"version": VERSION, "steps": self.steps, "events": self.events},
+                f_out,
+            )
+
+    @classmethod
+    def load(cls, filename: str):
+        """Loads recording from a JSON file written by save.
+
+        :param filename: String containing file path
+        :return recording: IORecording holding the file's events
+        """
+        with open(filename, "r") as f_in:
+            content = json.load(f_in)
+        if content.get("version") != VERSION:
+            raise ValueError("Invalid recording: unsupported format")
+        return cls(content["events"], content["steps"])
+
+
+class ReplayIO:
+    """Manager for I/O callbacks fed from a recording."""
+
+    def __init__(self, recording: IORecording):
+        """ReplayIO initializer.
+
+        :param recording: Recording of the run to reproduce
+        :return: None
+        """
+        self.events = [event for event in recording.events if event.kind != "pause"]
+        self.steps = recording.steps
+        self.inputs = iter(recording.get_events("read"))
+        self.outputs = iter(recording.get_events("write"))
+
+    def read_from_user(self) -> int:
+        """Returns the next recorded READ input.
+
+        :param: None
+        :return value: Recorded input value
+        """
+        event = next(self.inputs, None)
+        if event is None:
+            raise ValueError("Replay diverged: READ beyond recorded inputs")
+        return event.value
+
+    def write_to_console(self, value: int) -> None:
+        """Verifies a WRITE output against the next recorded output.
+
+        :param value: Value written by the program
+        :return: None
+        """
+        event = next(self.outputs, None)
+        if event is None:
+            raise ValueError(f"Replay diverged: unrecorded WRITE of {value}")
+        if value != event.value:
+            raise ValueError(
+                f"Replay diverged: WRITE of {value} where step {event.step} "
+                f"wrote {event.value}"
+            )
+
+    def finish(self, log: IORecording = None) -> None:
+        """Verifies that every recorded input was read and output reproduced.
+
+        With log, the replayed run's I/O must also happen at the recorded
+        step numbers and the run must take the recorded number of steps.
+
+        :param log: IORecording of the replayed run
+        :return: None
+        """
+        event = next(self.inputs, None)
+        if event is not None:
+            raise ValueError(
+                f"Replay diverged: missing READ of {event.value} "
+                f"from step {event.step}"
+            )
+        event = next(self.outputs, None)
+        if event is not None:
+            raise ValueError(
+                f"Replay diverged: missing WRITE of {event.value} "
+                f"from step {event.step}"
+            )
+        if log is None:
+            return
+        replayed = [event for event in log.events if event.kind != "pause"]
+        for event, expected in zip(replayed, self.events):
+            if event != expected:
+                raise ValueError(
+                    f"Replay diverged: {event.kind.upper()} of {event.value} at "
+                    f"step {event.step} where step {expected.step} "
+                    f"{expected.kind}s {expected.value}"
+                )
+        if len(replayed) != len(self.events):
+            raise ValueError(
+                f"Replay diverged: {len(replayed)} READ and WRITE events "
+                f"where the recording has {len(self.events)}"
+            )
+        if log.steps != self.steps:
+            raise ValueError(
+                f"Replay diverged: ran {log.steps} steps "
+                f"where the recording ran {self.steps}"
+            )
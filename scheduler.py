@@ -0,0 +1,237 @@
+"""Scheduler
+
+This module manages the cooperative time-slicing scheduler components.
+
+Each resident task runs on a warm controller for one quantum of
+instructions at a time. The next task to run is the resident one with the
+least weighted instruction usage (stride scheduling), so a priority class
+with twice the weight gets twice the instructions, and a newly admitted
+task starts level with the others instead of waiting behind long runs.
+"""
+
+import heapq
+from itertools import count
+from typing import NamedTuple
+
+from controller import UVSimController
+from model import DataModel, program_cache
+from uvb import read_image
+
+PRIORITIES = {"high": 4, "normal": 2, "low": 1}
+
+
+class TaskResult(NamedTuple):
+    """Outcome and resource accounting of one scheduled task.
+
+    status is a RunResult status, or "error" with the message in error.
+    steps counts the instructions the task executed, including the one that
+    raised when status is "error".
+    """
+
+    task_id: int
+    name: str
+    priority: str
+    status: str
+    outputs: list
+    accumulator: int
+    cursor: int
+    steps: int
+    slices: int
+    error: str
+
+
+class Task:
+    """Manager for the state of one scheduled program run."""
+
+    def __init__(self, task_id, name, priority, image, inputs, max_steps):
+        """Task initializer.
+
+        :param task_id: Identifier returned by Scheduler.submit
+        :param name: Task name for results
+        :param priority: Priority class name from PRIORITIES
+        :param image: Program image starting at memory index 0
+        :param inputs: READ values fed in order
+        :param max_steps: Maximum number of instructions, or None
+        :return: None
+        """
+        self.task_id = task_id
+        self.name = name
+        self.priority = priority
+        self.weight = PRIORITIES[priority]
+        self.image = image
+        self.inputs = list(inputs)
+        self.outputs = []
+        self.max_steps = max_steps
+        self.controller = None
+        self.virtual = 0.0
+        self.steps = 0
+        self.slices = 0
+
+    def read_from_user(self) -> int:
+        """Returns the next READ value.
+
+        :param: None
+        :return value: Next input value
+        """
+        if not self.inputs:
+            raise ValueError("READ beyond provided inputs")
+        return self.inputs.pop(0)
+
+
+class Scheduler:
+    """Manager for time-sliced execution of many programs in one process.
+
+    usage maps each unfinished task to the instructions charged to it so far;
+    a task's entry is dropped once its TaskResult is returned.
+    """
+
+    def __init__(
+        self, quantum: int = 1000, max_resident: int = 64, memory_size: int = 100
+    ):
+        """Scheduler initializer.
+
+        :param quantum: Instructions a task runs before the next task runs
+        :param max_resident: Maximum number of tasks holding a VM at once
+        :param memory_size: Number of words in main memory
+        :return: None
+        """
+        if quantum < 1 or max_resident < 1:
+            raise ValueError("Invalid scheduler: quantum and cap must be positive")
+        self.quantum = quantum
+        self.max_resident = max_resident
+        self.memory_size = memory_size
+        self.pool = []
+        self.waiting = []
+        self.resident = []
+        self.usage = {}
+        self.clock = 0.0
+        self.ids = count()
+
+    def submit(
+        self, program, inputs=(), priority="normal", name=None, max_steps=None
+    ) -> int:
+        """Queues a program run.
+
+        :param program: Program file path or image starting at memory index 0
+        :param inputs: READ values fed in order
+        :param priority: Priority class name from PRIORITIES
+        :param name: Task name for results, defaults to the file path or id
+        :param max_steps: Maximum number of instructions, or None
+        :return task_id: Identifier of the task
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"Invalid priority '{priority}'")
+        task_id = next(self.ids)
+        if isinstance(program, str):
+            name = program if name is None else name
+            if program.endswith(".uvb"):
+                program = read_image(program)[1]
+            else:
+                program = program_cache.load(program)
+        if len(program) > self.memory_size:
+            raise IndexError(f"Program exceeds {self.memory_size} memory words.")
+        task = Task(
+            task_id,
+            str(task_id) if name is None else name,
+            priority,
+            program,
+            inputs,
+            max_steps,
+        )
+        self.usage[task_id] = 0
+        rank = -PRIORITIES[priority]
+        heapq.heappush(self.waiting, (rank, task_id, task))
+        return task_id
+
+    def admit(self) -> None:
+        """Moves waiting tasks onto free VMs, higher priority classes first.
+
+        :param: None
+        :return: None
+        """
+        while self.waiting and len(self.resident) < self.max_resident:
+            _, _, task = heapq.heappop(self.waiting)
+            if self.pool:
+                controller = self.pool.pop()
+            else:
+                controller = UVSimController(
+                    halted=lambda: None, data_model=DataModel(self.memory_size)
+                )
+            controller.data_model.load_image(task.image)
+            controller.reset_accumulator()
+            controller.reset_cursor()
+            controller.reset_instruction()
+            controller.reset_io()
+            task.controller = controller
+            task.virtual = self.clock
+            heapq.heappush(self.resident, (task.virtual, task.task_id, task))
+
+    def run_slice(self, task: Task):
+        """Runs one quantum of a task.
+
+        :param task: Resident task
+        :return result: TaskResult when the task finished, otherwise None
+        """
+        controller = task.controller
+        budget = self.quantum
+        if task.max_steps is not None:
+            budget = min(budget, task.max_steps - task.steps)
+        try:
+            result = controller.execute_table(
+                task.read_from_user, task.outputs.append, max_steps=budget
+            )
+        except (ValueError, IndexError) as error:
+            status, steps, message = "error", controller.steps, str(error)
+        else:
+            status, steps, message = result.status, result.steps, None
+        task.steps += steps
+        task.slices += 1
+        task.virtual += max(steps, 1) / task.weight
+        self.usage[task.task_id] = task.steps
+        if status == "budget_exceeded" and task.steps != task.max_steps:
+            # Only the quantum ran out, so the task rejoins the rotation.
+            return None
+        return TaskResult(
+            task.task_id,
+            task.name,
+            task.priority,
+            status,
+            task.outputs,
+            controller.data_model.accumulator,
+            controller.cursor,
+            task.steps,
+            task.slices,
+            message,
+        )
+
+    def step(self):
+        """Runs one quantum of the resident task with least weighted usage.
+
+        :param: None
+        :return result: TaskResult when that task finished, otherwise None
+        """
+        self.admit()
+        if not self.resident:
+            return None
+        self.clock, _, task = heapq.heappop(self.resident)
+        result = self.run_slice(task)
+        if result is None:
+            heapq.heappush(self.resident, (task.virtual, task.task_id, task))
+        else:
+            self.pool.append(task.controller)
+            task.controller = None
+            del self.usage[task.task_id]
+        return result
+
+    def run(self):
+        """Runs every submitted task to completion.
+
+        Tasks may be submitted while iterating.
+
+        :param: None
+        :return: Generator of TaskResult in completion order
+        """
+        while self.waiting or self.resident:
+            result = self.step()
+            if result is not None:
+                yield result
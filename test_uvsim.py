@@ -1,13 +1,45 @@
 from unittest.mock import MagicMock, patch
-from controller import UVSimController, ArithmeticController
+from batch import BatchJob, load_manifest, run_batch, run_job
+from benchmark import run_benchmark, self_modifying
+from controller import (
+    ArithmeticController,
+    RunResult,
+    UVSimController,
+    WatchHit,
+)
+from fusion import fuse_cell, fuse_program
+from jit import BINDINGS, REWRITE_LIMIT, BlockCache
+from replay import IOEvent, IORecording
+from scheduler import Scheduler
+from tracing import TraceRecorder
 
 import unittest
 
-from model import DataModel
+from model import (
+    CompactDataModel,
+    DataModel,
+    ProgramCache,
+    iter_programs,
+    parse_program,
+    program_cache,
+)
+from uvb import convert_text, read_image, unpack_checkpoint, write_image
+
+try:
+    import vector
+except ImportError:
+    vector = None
 
 # Added this for testing load program.
+import asyncio
 import os
 import sys
+import json
+import shutil
+import tarfile
+import tempfile
+import tracemalloc
+import zipfile
 
 os.chdir(os.path.dirname(os.path.abspath(__file__)))
 
@@ -136,6 +168,296 @@ class TestDataModel(unittest.TestCase):
         self.data_model.set_instructions([1, 2, 3, 4, 5] + [0] * 95)
         self.assertEqual(self.data_model.get_instructions(), [1, 2, 3, 4, 5] + [0] * 95)
 
+    def test_decoded_cache(self):
+        self.data_model.set_instruction(3, 2105)
+        self.assertEqual(self.data_model.get_decoded(3), (21, 5))
+        self.assertEqual(self.data_model.decoded[3], (21, 5))
+        self.data_model.set_instruction(3, -4307)
+        self.assertIsNone(self.data_model.decoded[3])
+        self.assertEqual(self.data_model.get_decoded(3), (43, 7))
+
+    def test_snapshot_restore(self):
+        self.data_model.load_program("Test2.txt")
+        original = list(self.data_model.get_instructions())
+        self.data_model.set_accumulator(12)
+        self.data_model.snapshot()
+        self.data_model.set_instruction(9, 100)
+        self.data_model.set_instruction(9, 200)
+        self.data_model.set_accumulator(-5)
+        self.assertEqual(self.data_model.journal, {9: 0})
+        self.data_model.restore()
+        self.assertEqual(self.data_model.get_instructions(), original)
+        self.assertEqual(self.data_model.get_accumulator(), 12)
+        self.assertEqual(self.data_model.journal, {})
+
+    def test_restore_without_snapshot(self):
+        with self.assertRaises(ValueError):
+            self.data_model.restore()
+        self.data_model.snapshot()
+        self.data_model.set_instructions([0] * 100)
+        with self.assertRaises(ValueError):
+            self.data_model.restore()
+
+    def test_memory_hash(self):
+        self.data_model.load_program("Test2.txt")
+        self.data_model.get_memory_hash()
+        self.data_model.set_instruction(20, 1234)
+        self.data_model.set_instruction(0, -55)
+        memory_hash = self.data_model.memory_hash
+        self.data_model.memory_hash = None
+        self.assertEqual(self.data_model.get_memory_hash(), memory_hash)
+
+    def test_decoded_cache_reset_on_load(self):
+        self.data_model.get_decoded(0)
+        self.data_model.load_program("Test1.txt")
+        self.assertEqual(self.data_model.decoded, [None] * 100)
+        self.assertEqual(self.data_model.get_decoded(0), (10, 7))
+
+
+class TestCompactDataModel(unittest.TestCase):
+    def setUp(self):
+        self.data_model = CompactDataModel()
+
+    def test_slots(self):
+        self.assertFalse(hasattr(self.data_model, "__dict__"))
+        self.assertFalse(hasattr(DataModel(), "__dict__"))
+
+    def test_memory_view(self):
+        self.data_model.load_program("Test1.txt")
+        view = self.data_model.get_memory_view()
+        self.assertEqual(view[0], 1007)
+        self.data_model.set_instruction(0, -4300)
+        self.assertEqual(view[0], -4300)
+        self.data_model.set_instructions(list(range(100)))
+        self.assertEqual(view.tolist(), list(range(100)))
+
+    def test_set_instructions_wrong_size(self):
+        with self.assertRaises(ValueError):
+            self.data_model.set_instructions([1, 2, 3])
+
+    def test_lazy_caches(self):
+        tracemalloc.start()
+        models = [CompactDataModel() for _ in range(100)]
+        for data_model in models:
+            data_model.set_instructions([1000 + idx for idx in range(100)])
+        size = tracemalloc.get_traced_memory()[0] / len(models)
+        tracemalloc.stop()
+        self.assertLess(size, 1300)
+        self.assertEqual(len(models[0].decoded), 0)
+
+        controller = UVSimController(MagicMock(), data_model=self.data_model)
+        self.data_model.load_program("Test1.txt")
+        controller.execute_fused(MagicMock(return_value=5), MagicMock())
+        self.assertLessEqual(len(self.data_model.decoded), 10)
+        self.data_model.set_instruction(0, 4300)
+        self.assertIsNone(self.data_model.decoded[0])
+
+    def test_word_range(self):
+        program = [2020, 3020, 2120, 4001] + [0] * 16 + [1] + [0] * 79
+        for engine in UVSimController.ENGINES:
+            controller = UVSimController(
+                MagicMock(), engine=engine, data_model=CompactDataModel()
+            )
+            controller.data_model.set_instructions(program)
+            with self.subTest(engine=engine):
+                with self.assertRaises(OverflowError):
+                    controller.execute_program(None, None)
+                self.assertEqual(controller.cursor, 2)
+                self.assertEqual(controller.data_model.get_accumulator(), 2**31)
+        controller = UVSimController(MagicMock())
+        controller.data_model.set_instructions(list(program))
+        result = controller.execute_bounded(None, None, max_steps=200)
+        self.assertEqual(result.status, "budget_exceeded")
+
+
+class TestProgramCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = ProgramCache(maxsize=2)
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, lines):
+        filename = os.path.join(self.directory.name, name)
+        with open(filename, "w") as f_out:
+            f_out.write("\n".join(lines) + "\n")
+        return filename
+
+    def test_hit_and_miss(self):
+        filename = self.write("a.txt", ["+1007", "-0003"])
+        image = self.cache.load(filename)
+        self.assertEqual(image, (1007, -3))
+        self.assertIs(self.cache.load(filename), image)
+        self.assertEqual(self.cache.info()[:4], (1, 1, 1, 1))
+
+    def test_content_dedup(self):
+        image = self.cache.load(self.write("a.txt", ["+4300"]))
+        self.assertIs(self.cache.load(self.write("b.txt", ["+4300"])), image)
+        self.assertEqual(self.cache.info()[:4], (0, 2, 2, 1))
+
+    def test_modified_file(self):
+        filename = self.write("a.txt", ["+4300"])
+        self.cache.load(filename)
+        self.write("a.txt", ["+1007", "+4300"])
+        self.assertEqual(self.cache.load(filename), (1007, 4300))
+        self.assertEqual(self.cache.info().misses, 2)
+
+    def test_eviction(self):
+        first = self.write("a.txt", ["+1"])
+        self.cache.load(first)
+        self.cache.load(self.write("b.txt", ["+2"]))
+        self.cache.load(first)
+        self.cache.load(self.write("c.txt", ["+3"]))
+        self.assertEqual(self.cache.info()[2:4], (2, 2))
+        self.cache.load(first)
+        self.assertEqual(self.cache.info().hits, 2)
+
+    def test_data_model_load_program(self):
+        hits = program_cache.info().hits
+        DataModel().load_program("Test1.txt")
+        data_model = CompactDataModel()
+        data_model.load_program("Test1.txt")
+        self.assertEqual(data_model.get_instruction(9), 0)
+        self.assertEqual(len(program_cache.load("Test1.txt")), 10)
+        self.assertGreater(program_cache.info().hits, hits)
+
+    def test_program_too_large(self):
+        filename = self.write("a.txt", ["+0"] * 101)
+        with self.assertRaises(IndexError):
+            DataModel().load_program(filename)
+
+
+class TestBinaryImage(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.filename = os.path.join(self.directory.name, "Test1.uvb")
+
+    def test_convert_and_load(self):
+        convert_text("Test1.txt", self.filename)
+        expected = DataModel()
+        expected.load_program("Test1.txt")
+        for data_model in (DataModel(), CompactDataModel()):
+            data_model.load_program(self.filename)
+            self.assertEqual(
+                list(data_model.get_instructions()), expected.get_instructions()
+            )
+
+    def test_wide_words(self):
+        write_image(self.filename, [2065000, -43000000], 65536, word_size=8)
+        data_model = DataModel(65536)
+        data_model.load_program(self.filename)
+        self.assertEqual(data_model.get_instructions()[:3], [2065000, -43000000, 0])
+
+    def test_checksum_mismatch(self):
+        write_image(self.filename, [1007, 4300])
+        with open(self.filename, "r+b") as f_out:
+            f_out.seek(-1, os.SEEK_END)
+            f_out.write(b"\x01")
+        with self.assertRaises(ValueError):
+            DataModel().load_program(self.filename)
+
+    def test_memory_size_mismatch(self):
+        write_image(self.filename, [1007, 4300], 1000)
+        with self.assertRaises(ValueError):
+            DataModel().load_program(self.filename)
+
+    def test_controller_runs_image(self):
+        convert_text("Test3.txt", self.filename)
+        controller = UVSimController(MagicMock(), engine="jit")
+        controller.load_program(self.filename)
+        write_to_console = MagicMock()
+        controller.execute_program(MagicMock(side_effect=[20, 22]), write_to_console)
+        write_to_console.assert_called_once_with(42)
+
+
+class TestProgramCorpus(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+        self.corpus = os.path.join(self.root, "corpus")
+        os.makedirs(os.path.join(self.corpus, "b"))
+        shutil.copy("Test1.txt", os.path.join(self.corpus, "a.txt"))
+        shutil.copy("Test3.txt", os.path.join(self.corpus, "b", "c.txt"))
+        convert_text("Test2.txt", os.path.join(self.corpus, "b", "d.uvb"))
+        with open(os.path.join(self.corpus, "notes.md"), "w") as f_out:
+            f_out.write("not a program")
+        self.expected = []
+        for name in ("Test1.txt", "Test3.txt"):
+            with open(name) as f_in:
+                self.expected.append(parse_program(f_in))
+
+    def test_parse_program(self):
+        lines = ["+1007", "", " 4300 ", "-99999", "12"]
+        self.assertEqual(parse_program(lines), (1007, 4300))
+        self.assertEqual(self.expected[0][-1], 0)
+        self.assertEqual(len(self.expected[0]), 10)
+        with self.assertRaises(ValueError):
+            parse_program(["+1007", "HALT"])
+        self.assertEqual(parse_program(lines, sentinel=None)[-2:], (-99999, 12))
+
+    def test_loaders_agree(self):
+        target = os.path.join(self.root, "Test1.uvb")
+        convert_text("Test1.txt", target)
+        manifest = os.path.join(self.root, "jobs.jsonl")
+        with open("Test1.txt") as f_in, open(manifest, "w") as f_out:
+            f_out.write(json.dumps({"program": f_in.read()}) + "\n")
+        images = [
+            program_cache.load("Test1.txt"),
+            tuple(read_image(target)[1]),
+            next(iter_programs("Test1.txt"))[1],
+            load_manifest(manifest)[0].source,
+        ]
+        for image in images:
+            self.assertEqual(image, self.expected[0])
+
+    def test_directory(self):
+        programs = list(iter_programs(self.corpus))
+        self.assertEqual(
+            [os.path.relpath(name, self.corpus) for name, _ in programs],
+            ["a.txt", os.path.join("b", "c.txt"), os.path.join("b", "d.uvb")],
+        )
+        self.assertEqual([image for _, image in programs][:2], self.expected)
+        self.assertEqual(programs[2][1][:2], (1009, 1010))
+
+    def test_archives(self):
+        archive = os.path.join(self.root, "corpus.zip")
+        with zipfile.ZipFile(archive, "w") as f_out:
+            f_out.write(os.path.join(self.corpus, "a.txt"), "a.txt")
+            f_out.write(os.path.join(self.corpus, "b", "c.txt"), "b/c.txt")
+        self.assertEqual([image for _, image in iter_programs(archive)], self.expected)
+
+        archive = os.path.join(self.root, "corpus.tar.gz")
+        with tarfile.open(archive, "w:gz") as f_out:
+            f_out.add(self.corpus, "corpus")
+        names = [name for name, _ in iter_programs(archive)]
+        self.assertEqual(sorted(names)[:2], ["corpus/a.txt", "corpus/b/c.txt"])
+        self.assertEqual(len(names), 3)
+
+    def test_jsonl(self):
+        jobs = os.path.join(self.root, "jobs.jsonl")
+        with open(jobs, "w") as f_out:
+            f_out.write(json.dumps({"name": "listed", "program": [1007, 4300]}) + "\n")
+            f_out.write("\n")
+            f_out.write(json.dumps({"program": "+1007\n+4300\n-99999\n"}) + "\n")
+            f_out.write(json.dumps({"title": "no program"}) + "\n")
+            for program in (None, 1007, {"words": [1007]}, [1007, None]):
+                f_out.write(json.dumps({"program": program}) + "\n")
+        with self.assertRaises(ValueError):
+            list(iter_programs(jobs))
+        programs = list(iter_programs(jobs, skip_invalid=True))
+        self.assertEqual(
+            programs, [("listed", (1007, 4300)), (f"{jobs}:3", (1007, 4300))]
+        )
+
+    def test_load_image(self):
+        for data_model in (DataModel(), CompactDataModel()):
+            data_model.load_program("Test1.txt")
+            data_model.load_image((1009, 4300))
+            self.assertEqual(
+                list(data_model.get_instructions()), [1009, 4300] + [0] * 98
+            )
+
 
 class MockDataModel(DataModel):
     def __init__(self):
@@ -316,6 +638,13 @@ class TestBranchController(unittest.TestCase):
                 instruction_idx,
             )
 
+    def test_branch_large_address_space(self):
+        uvsim = UVSimController(data_model=DataModel(1000))
+        self.assertEqual(uvsim.branch(500), 499)
+        self.assertRaises(IndexError, uvsim.branch, 1000)
+        self.assertEqual(uvsim.branch_zero(3, 0, 999), 998)
+        self.assertTrue(uvsim.get_program_text().startswith("000:   +0\n"))
+
     def test_halt_sucess(self):
         halted, instruction_idx = None, 0
 
@@ -323,5 +652,959 @@ class TestBranchController(unittest.TestCase):
         self.assertEquals(self.uvsim.halt(halted, instruction_idx), instruction_idx)
 
 
+COUNTDOWN_PROGRAM = [2010, 4207, 3111, 2110, 1110, 4000, 0, 4300, 0, 0, 5, 1] + [0] * 88
+
+
+class TestExecutionEngines(unittest.TestCase):
+    def run_engine(
+        self, engine, program=None, filename=None, inputs=(), data_model=None
+    ):
+        controller = UVSimController(MagicMock(), engine=engine, data_model=data_model)
+        if filename:
+            controller.load_program(filename)
+        elif program:
+            controller.data_model.set_instructions(list(program))
+        read_from_user = MagicMock(side_effect=list(inputs))
+        write_to_console = MagicMock()
+        controller.execute_program(read_from_user, write_to_console)
+        outputs = [call.args[0] for call in write_to_console.call_args_list]
+        return controller, outputs
+
+    def assert_engines_agree(self, **kwargs):
+        expected, expected_outputs = self.run_engine("match", **kwargs)
+        for engine in UVSimController.ENGINES:
+            controller, outputs = self.run_engine(engine, **kwargs)
+            with self.subTest(engine=engine):
+                self.assertEqual(outputs, expected_outputs)
+                self.assertEqual(controller.cursor, expected.cursor)
+                self.assertEqual(controller.instruction, expected.instruction)
+                self.assertEqual(
+                    controller.data_model.get_accumulator(),
+                    expected.data_model.get_accumulator(),
+                )
+                self.assertEqual(
+                    controller.data_model.get_instructions(),
+                    expected.data_model.get_instructions(),
+                )
+
+    def test_countdown_loop(self):
+        _, outputs = self.run_engine("table", program=COUNTDOWN_PROGRAM)
+        self.assertEqual(outputs, [4, 3, 2, 1, 0])
+        self.assert_engines_agree(program=COUNTDOWN_PROGRAM)
+
+    def test_test_programs(self):
+        self.assert_engines_agree(filename="Test1.txt", inputs=[12, 34])
+        self.assert_engines_agree(filename="Test2.txt", inputs=[3, 7])
+        self.assert_engines_agree(filename="Test2.txt", inputs=[7, 3])
+        self.assert_engines_agree(filename="Test3.txt", inputs=[20, 22])
+
+    def test_compact_data_model(self):
+        _, expected = self.run_engine("match", program=COUNTDOWN_PROGRAM)
+        for engine in UVSimController.ENGINES:
+            controller, outputs = self.run_engine(
+                engine, program=COUNTDOWN_PROGRAM, data_model=CompactDataModel()
+            )
+            with self.subTest(engine=engine):
+                self.assertEqual(outputs, expected)
+                self.assertEqual(controller.data_model.get_instruction(10), 0)
+
+    def test_large_address_space(self):
+        program = [20500, 42007, 31501, 21500, 11500, 40000, 0, 43000]
+        program += [0] * 492 + [5, 1] + [0] * 498
+        for engine in UVSimController.ENGINES:
+            controller, outputs = self.run_engine(
+                engine, program=program, data_model=DataModel(1000)
+            )
+            with self.subTest(engine=engine):
+                self.assertEqual(outputs, [4, 3, 2, 1, 0])
+                self.assertEqual(controller.cursor, 0)
+
+    def test_wide_word_arithmetic(self):
+        program = [20500, 33501, 21502, 11502, 32503, 21502, 11502, 43000]
+        program += [0] * 492 + [300, 400, 0, 2] + [0] * 496
+        for engine in UVSimController.ENGINES:
+            _, outputs = self.run_engine(
+                engine, program=program, data_model=DataModel(1000)
+            )
+            with self.subTest(engine=engine):
+                self.assertEqual(outputs, [20000, 10000])
+        if vector:
+            machine = vector.run_lockstep(program, [[]], memory_size=1000)
+            self.assertEqual(machine.get_outputs(0), [20000, 10000])
+
+    def test_wide_compact_address_space(self):
+        data_model = CompactDataModel(65536)
+        self.assertEqual(data_model.operand_base, 100000)
+        data_model.set_instruction(0, 2065000)
+        data_model.set_instruction(1, 1165001)
+        data_model.set_instruction(2, 4300000)
+        data_model.set_instruction(65001, 1234)
+        controller, outputs = self.run_engine("jit", data_model=data_model, program=())
+        self.assertEqual(outputs, [1234])
+
+    def test_restore_program(self):
+        for engine in UVSimController.ENGINES:
+            controller = UVSimController(MagicMock(), engine=engine)
+            controller.load_program("Test3.txt")
+            original = list(controller.data_model.get_instructions())
+            runs = []
+            for inputs in ([20, 22], [1, 2]):
+                write_to_console = MagicMock()
+                read_from_user = MagicMock(side_effect=inputs)
+                controller.execute_program(read_from_user, write_to_console)
+                runs.append(write_to_console.call_args.args[0])
+                with self.subTest(engine=engine):
+                    self.assertEqual(sorted(controller.data_model.journal), [9, 10, 11])
+                controller.restore_program()
+                self.assertEqual(controller.data_model.get_instructions(), original)
+            self.assertEqual(runs, [42, 3])
+
+    def test_invalid_operation_code(self):
+        self.assert_engines_agree(program=[1109, -99999] + [0] * 98)
+
+    def test_self_modifying_program(self):
+        program = [1110, 2011, 2100, 4000] + [0] * 6 + [42, 4300] + [0] * 88
+        _, outputs = self.run_engine("table", program=program)
+        self.assertEqual(outputs, [42])
+        self.assert_engines_agree(program=program)
+
+    def test_rewritten_cell_in_loop(self):
+        self.assert_engines_agree(program=self_modifying(2 * REWRITE_LIMIT))
+
+    def test_store_into_fused_group(self):
+        program = [2010, 4205, 2011, 2101, 4000, 1110, 4300] + [0] * 3 + [1, 4300]
+        controller, outputs = self.run_engine("fused", program=program + [0] * 88)
+        self.assertEqual(outputs, [])
+        self.assertEqual(controller.data_model.get_instruction(1), 4300)
+        self.assert_engines_agree(program=program + [0] * 88)
+
+    def test_divide_by_zero(self):
+        for engine in UVSimController.ENGINES:
+            with self.subTest(engine=engine), self.assertRaises(ValueError):
+                self.run_engine(engine, program=[2005, 3206, 4300, 0, 0, 10, 0])
+
+    def test_display_values(self):
+        for engine in UVSimController.ENGINES:
+            display_values = MagicMock()
+            controller = UVSimController(display_values=display_values, engine=engine)
+            controller.data_model.set_instructions(list(COUNTDOWN_PROGRAM))
+            controller.execute_program(MagicMock(), MagicMock())
+            with self.subTest(engine=engine):
+                calls = display_values.call_args_list
+                self.assertEqual(calls[0].args, ("0\n", "0\n"))
+                self.assertEqual(calls[1].args, ("5\n", "1\n"))
+                self.assertEqual(display_values.call_count, 33)
+
+
+class TestHeadlessExecution(unittest.TestCase):
+    def setUp(self):
+        self.display_values = MagicMock()
+        self.controller = UVSimController(MagicMock(), self.display_values)
+        self.controller.data_model.set_instructions(list(COUNTDOWN_PROGRAM))
+        self.write_to_console = MagicMock()
+
+    def test_final_state_only(self):
+        for engine in UVSimController.ENGINES:
+            with self.subTest(engine=engine):
+                self.setUp()
+                self.controller.execute_headless(
+                    MagicMock(), self.write_to_console, engine=engine
+                )
+                self.display_values.assert_called_once_with("0\n", "0\n")
+                self.assertEqual(self.write_to_console.call_count, 5)
+                self.assertIs(self.controller.display_values, self.display_values)
+
+    def test_sample_every(self):
+        self.controller.execute_headless(
+            MagicMock(), self.write_to_console, sample_every=10
+        )
+        calls = self.display_values.call_args_list
+        self.assertEqual(len(calls), 5)
+        self.assertEqual(calls[0].args, ("0\n", "0\n"))
+        self.assertEqual(calls[1].args, ("3\n", "4\n"))
+        self.assertEqual(calls[-1].args, ("0\n", "0\n"))
+
+
+class TestBoundedExecution(unittest.TestCase):
+    def setUp(self):
+        self.controller = UVSimController(MagicMock())
+
+    def test_step_budget(self):
+        self.controller.data_model.set_instructions([2003, 4001, 0, 7] + [0] * 96)
+        result = self.controller.execute_bounded(None, None, max_steps=5000)
+        self.assertEqual(result, RunResult("budget_exceeded", 5000, 1, 7))
+        self.assertEqual(self.controller.cursor, 1)
+        self.controller.halted.assert_not_called()
+
+    def test_timeout(self):
+        self.controller.data_model.set_instructions([4000] + [0] * 99)
+        result = self.controller.execute_bounded(None, None, timeout=0.01)
+        self.assertEqual(result.status, "deadline_exceeded")
+        self.assertEqual(result.steps % 1024, 0)
+
+    def test_detect_loop(self):
+        self.controller.data_model.set_instructions([2010, 4204, 4000] + [0] * 97)
+        self.controller.data_model.set_instruction(10, 3)
+        result = self.controller.execute_bounded(None, None, detect_loops=True)
+        self.assertEqual(result.status, "loop_detected")
+        self.assertEqual(result.cursor, 1)
+        self.assertEqual(result.accumulator, 3)
+        self.assertLess(result.steps, 20)
+
+    def test_detect_loop_entry(self):
+        program = [2010, 4204, 3011, 4000, 0, 0, 0, 0, 0, 0, 3]
+        self.controller.data_model.set_instructions(program + [0] * 89)
+        result = self.controller.execute_bounded(None, None, detect_loops=True)
+        self.assertEqual(result.status, "loop_detected")
+        self.assertEqual((result.cursor, result.accumulator), (1, 3))
+        self.assertEqual(self.controller.cursor, 1)
+
+        program = [1011, 2010, 3011, 4001, 0, 0, 0, 0, 0, 0, 3]
+        self.controller.reset_cursor()
+        self.controller.data_model.set_instructions(program + [0] * 89)
+        result = self.controller.execute_bounded(
+            MagicMock(return_value=4), None, detect_loops=True
+        )
+        self.assertEqual((result.cursor, result.accumulator), (2, 3))
+
+        program = [2010, 2111, 2012, 2111, 4000, 0, 0, 0, 0, 0, 5, 0, 6]
+        self.controller.reset_cursor()
+        self.controller.data_model.set_instructions(program + [0] * 87)
+        self.controller.data_model.snapshot()
+        result = self.controller.execute_bounded(None, None, detect_loops=True)
+        self.assertEqual((result.cursor, result.accumulator), (2, 5))
+        self.assertEqual(self.controller.data_model.get_instruction(11), 5)
+        self.controller.restore_program()
+        self.assertEqual(self.controller.data_model.get_instruction(11), 0)
+
+    def test_detect_loop_terminating_programs(self):
+        self.controller.data_model.set_instructions(list(COUNTDOWN_PROGRAM))
+        result = self.controller.execute_bounded(None, MagicMock(), detect_loops=True)
+        self.assertEqual(result, RunResult("halted", 33, 0, 0))
+        expected = DataModel()
+        expected.set_instructions(list(self.controller.data_model.memory))
+        self.assertEqual(
+            self.controller.data_model.memory_hash, expected.get_memory_hash()
+        )
+
+        self.controller.reset_cursor()
+        program = [1010, 2010, 4205, 4000, 0, 4300] + [0] * 94
+        self.controller.data_model.set_instructions(program)
+        read_from_user = MagicMock(side_effect=[4, 4, 4, 0])
+        result = self.controller.execute_bounded(
+            read_from_user, None, detect_loops=True
+        )
+        self.assertEqual(result.status, "halted")
+        self.assertEqual(read_from_user.call_count, 4)
+
+    def test_resume_after_budget(self):
+        self.controller.data_model.set_instructions(list(COUNTDOWN_PROGRAM))
+        write_to_console = MagicMock()
+        results = []
+        while not results or results[-1].status == "budget_exceeded":
+            results.append(
+                self.controller.execute_bounded(None, write_to_console, max_steps=4)
+            )
+        self.assertEqual(sum(result.steps for result in results), 33)
+        self.assertEqual(results[-1], RunResult("halted", 1, 0, 0))
+        self.assertEqual(write_to_console.call_count, 5)
+        self.controller.halted.assert_called_once()
+
+
+class TestCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.program = [1020, 1120, 2021, 3122, 2121, 4207, 4000, 4300] + [0] * 92
+        self.program[21], self.program[22] = 4, 1
+        self.inputs = [5, -6, 7, 8]
+
+    def test_resume_in_new_controller(self):
+        expected = UVSimController(MagicMock())
+        expected.data_model.set_instructions(list(self.program))
+        expected_output = MagicMock()
+        expected.execute_table(MagicMock(side_effect=self.inputs), expected_output)
+
+        for compress in (False, True):
+            first = UVSimController(MagicMock())
+            first.data_model.set_instructions(list(self.program))
+            output = MagicMock()
+            result = first.execute_bounded(
+                MagicMock(side_effect=self.inputs), output, max_steps=10
+            )
+            self.assertEqual(result.status, "budget_exceeded")
+            self.assertEqual((first.reads, first.writes), (2, 2))
+            blob = first.checkpoint(compress)
+
+            second = UVSimController(MagicMock(), engine="jit")
+            second.restore_checkpoint(blob)
+            self.assertEqual(second.get_acc_cur(), first.get_acc_cur())
+            second.execute_program(
+                MagicMock(side_effect=self.inputs[second.reads :]), output
+            )
+            self.assertEqual(output.call_args_list, expected_output.call_args_list)
+            self.assertEqual(second.data_model.memory, expected.data_model.memory)
+            self.assertEqual(second.writes, 4)
+
+    def test_wide_words(self):
+        controller = UVSimController(data_model=DataModel(1000))
+        controller.data_model.set_instruction(999, 2**40)
+        state = unpack_checkpoint(controller.checkpoint())
+        self.assertEqual(state.memory.itemsize, 8)
+        self.assertEqual(state.memory[999], 2**40)
+
+    def test_corrupt_checkpoint(self):
+        controller = UVSimController()
+        blob = bytearray(controller.checkpoint())
+        blob[-1] ^= 1
+        with self.assertRaises(ValueError):
+            controller.restore_checkpoint(bytes(blob))
+        with self.assertRaises(ValueError):
+            controller.restore_checkpoint(b"UVB\x00")
+
+    def test_geometry_mismatch(self):
+        blob = UVSimController().checkpoint()
+        with self.assertRaises(ValueError):
+            UVSimController(data_model=DataModel(1000)).restore_checkpoint(blob)
+        with self.assertRaises(ValueError):
+            UVSimController(data_model=DataModel(100, 3)).restore_checkpoint(blob)
+
+    def test_save_program_round_trip(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        for name in ("saved.txt", "saved.uvb"):
+            filename = os.path.join(directory.name, name)
+            data_model = DataModel()
+            data_model.set_instructions(list(self.program))
+            data_model.set_instruction(30, -17)
+            data_model.save_program(filename)
+            loaded = DataModel()
+            loaded.load_program(filename)
+            self.assertEqual(loaded.get_instructions(), data_model.get_instructions())
+
+
+class TestTraceRecorder(unittest.TestCase):
+    def setUp(self):
+        self.recorder = TraceRecorder(keyframe_interval=4)
+        self.controller = UVSimController(MagicMock())
+        self.controller.data_model.set_instructions(list(COUNTDOWN_PROGRAM))
+        self.controller.execute_table(
+            None, MagicMock(), fuse=True, recorder=self.recorder
+        )
+
+    def expected_states(self):
+        controller = UVSimController(MagicMock())
+        controller.data_model.set_instructions(list(COUNTDOWN_PROGRAM))
+        states = []
+        for step in range(33):
+            cursor = controller.cursor
+            controller.execute_bounded(None, MagicMock(), max_steps=1)
+            states.append(
+                (step, cursor, controller.data_model.accumulator)
+                + (list(controller.data_model.memory),)
+            )
+        return states
+
+    def test_reconstructs_every_step(self):
+        self.assertEqual(len(self.recorder), 33)
+        self.assertEqual(len(self.recorder.keyframes), 9)
+        expected = self.expected_states()
+        for step in range(33):
+            self.assertEqual(tuple(self.recorder.state_at(step)), expected[step])
+        states = [
+            (*state[:3], list(state.memory))
+            for state in self.recorder.iter_states(10, 20)
+        ]
+        self.assertEqual(states, [tuple(state) for state in expected[10:20]])
+        with self.assertRaises(IndexError):
+            self.recorder.state_at(33)
+
+    def test_bounded_slices_extend_trace(self):
+        recorder = TraceRecorder(keyframe_interval=4)
+        controller = UVSimController(MagicMock())
+        controller.data_model.set_instructions(list(COUNTDOWN_PROGRAM))
+        while True:
+            result = controller.execute_bounded(
+                None, MagicMock(), max_steps=5, recorder=recorder
+            )
+            if result.status != "budget_exceeded":
+                break
+        self.assertEqual(recorder.cursors, self.recorder.cursors)
+        self.assertEqual(recorder.deltas, self.recorder.deltas)
+
+    def test_invalid_step_recorded(self):
+        recorder = TraceRecorder()
+        controller = UVSimController(MagicMock())
+        controller.data_model.set_instructions([2010, 3010, 9900] + [0] * 97)
+        controller.data_model.set_instruction(10, 4)
+        result = controller.execute_table(None, None, recorder=recorder)
+        self.assertEqual(result.status, "invalid")
+        self.assertEqual(len(recorder), result.steps)
+        self.assertEqual(recorder.cursors[-1], 2)
+        self.assertEqual(recorder.state_at(2).accumulator, 8)
+
+    def test_dump_and_load(self):
+        for compression in (None, "zlib", "lzma"):
+            loaded = TraceRecorder.load(self.recorder.dump(compression))
+            self.assertEqual(len(loaded), 33)
+            for step in (0, 5, 32):
+                self.assertEqual(loaded.state_at(step), self.recorder.state_at(step))
+        with self.assertRaises(ValueError):
+            self.recorder.dump("gzip")
+        with self.assertRaises(ValueError):
+            TraceRecorder.load(self.recorder.dump("zlib")[:-4])
+
+    def test_wide_deltas(self):
+        recorder = TraceRecorder()
+        recorder.start([0] * 100, 0)
+        recorder.record(0, 1, 5, 2**40, [0] * 100)
+        self.assertEqual(recorder.deltas.typecode, "q")
+        self.assertEqual(recorder.state_at(0).accumulator, 2**40)
+
+
+class TestIOReplay(unittest.TestCase):
+    def setUp(self):
+        self.program = [1020, 1120, 2021, 3122, 2121, 4207, 4000, 4300] + [0] * 92
+        self.program[21], self.program[22] = 3, 1
+        self.recording = IORecording()
+        controller = UVSimController(MagicMock(), engine="jit")
+        controller.data_model.set_instructions(list(self.program))
+        controller.execute_program(
+            MagicMock(side_effect=[4, -5, 6]), MagicMock(), record=self.recording
+        )
+
+    def replay(self, program, engine):
+        controller = UVSimController(MagicMock())
+        controller.data_model.set_instructions(program)
+        controller.execute_program(None, None, engine, replay=self.recording)
+
+    def test_record_steps(self):
+        self.assertEqual(
+            self.recording.events,
+            [
+                IOEvent(0, "read", 4),
+                IOEvent(1, "write", 4),
+                IOEvent(7, "read", -5),
+                IOEvent(8, "write", -5),
+                IOEvent(14, "read", 6),
+                IOEvent(15, "write", 6),
+            ],
+        )
+        self.assertEqual(self.recording.steps, 21)
+
+    def test_replay_engines(self):
+        for engine in UVSimController.ENGINES:
+            with self.subTest(engine=engine):
+                if engine in ("table", "fused"):
+                    self.replay(list(self.program), engine)
+                else:
+                    with self.assertRaises(ValueError):
+                        self.replay(list(self.program), engine)
+
+    def test_replay_unread_input(self):
+        recording = IORecording()
+        controller = UVSimController(MagicMock())
+        controller.data_model.set_instructions([1010, 1110, 1011, 4300] + [0] * 96)
+        controller.execute_program(
+            MagicMock(side_effect=[5, 6]), MagicMock(), record=recording
+        )
+        controller = UVSimController(MagicMock())
+        controller.data_model.set_instructions([1010, 1110, 4300] + [0] * 97)
+        with self.assertRaisesRegex(ValueError, "missing READ of 6"):
+            controller.execute_program(None, None, replay=recording)
+
+    def test_replay_step_count(self):
+        program = list(self.program)
+        program[7], program[8] = 4008, 4300
+        with self.assertRaisesRegex(ValueError, "ran 22 steps"):
+            self.replay(program, None)
+
+    def test_record_and_replay_exclusive(self):
+        controller = UVSimController(MagicMock())
+        controller.data_model.set_instructions(list(self.program))
+        with self.assertRaises(ValueError):
+            controller.execute_program(
+                None, None, record=IORecording(), replay=self.recording
+            )
+        with self.assertRaises(ValueError):
+            controller.execute_program(
+                MagicMock(return_value=0), MagicMock(), "jit", record=IORecording()
+            )
+
+    def test_replay_divergence(self):
+        program = list(self.program)
+        program[1] = 1121
+        with self.assertRaises(ValueError):
+            self.replay(program, None)
+        program = list(self.program)
+        program[21] = 2
+        with self.assertRaises(ValueError):
+            self.replay(program, "table")
+        program[21] = 4
+        with self.assertRaises(ValueError):
+            self.replay(program, "fused")
+
+    def test_replay_step_divergence(self):
+        program = list(self.program)
+        program[0], program[8], program[9] = 4008, 1020, 4001
+        with self.assertRaisesRegex(ValueError, "at step 1 where step 0"):
+            self.replay(program, None)
+
+    def test_save_and_load(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        filename = os.path.join(directory.name, "incident.json")
+        self.recording.save(filename)
+        loaded = IORecording.load(filename)
+        self.assertEqual(loaded.events, self.recording.events)
+        self.assertEqual(loaded.steps, 21)
+
+
+class TestWatchpoints(unittest.TestCase):
+    def setUp(self):
+        self.controller = UVSimController(MagicMock())
+        self.controller.data_model.set_instructions(list(COUNTDOWN_PROGRAM))
+
+    def test_stop_on_write(self):
+        self.controller.add_watchpoint(10)
+        result = self.controller.execute_table(None, MagicMock())
+        self.assertEqual(result, RunResult("watchpoint", 4, 4, 4))
+        self.assertEqual(self.controller.data_model.memory[10], 4)
+        result = self.controller.execute_table(None, MagicMock())
+        self.assertEqual(result, RunResult("watchpoint", 6, 4, 3))
+
+    def test_callback_hits(self):
+        hits = []
+        self.controller.add_watchpoint(10, 12, "rw", hits.append)
+        write_to_console = MagicMock()
+        self.controller.execute_program(None, write_to_console, "jit")
+        self.controller.halted.assert_called_once()
+        writes = [hit for hit in hits if hit.kind == "write"]
+        self.assertEqual(writes[0], WatchHit(3, 3, 10, "write", 5, 4))
+        self.assertEqual([hit.new for hit in writes], [4, 3, 2, 1, 0])
+        reads = [hit for hit in hits if hit.kind == "read"]
+        self.assertEqual(len(reads), 6 + 5 + 5)
+        self.assertEqual(write_to_console.call_count, 5)
+
+    def test_remove_watchpoint(self):
+        watch_id = self.controller.add_watchpoint(10, mode="r")
+        self.controller.remove_watchpoint(watch_id)
+        self.assertEqual(self.controller.watchpoints, {})
+        result = self.controller.execute_fused(None, MagicMock())
+        self.assertEqual(result.status, "halted")
+
+    def test_invalid_watchpoint(self):
+        with self.assertRaises(IndexError):
+            self.controller.add_watchpoint(99, 101)
+        with self.assertRaises(ValueError):
+            self.controller.add_watchpoint(10, mode="x")
+
+
+class TestBatchRunner(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.manifest = os.path.join(self.directory.name, "manifest.jsonl")
+        shutil.copy("Test3.txt", self.directory.name)
+        jobs = [{"file": "Test3.txt", "inputs": [20, value]} for value in range(40)]
+        jobs.append({"name": "inline", "program": [1005, 1105, 4300]})
+        jobs.append({"program": "+4000\n"})
+        with open(self.manifest, "w") as f_out:
+            f_out.writelines(json.dumps(job) + "\n" for job in jobs)
+
+    def test_load_manifest(self):
+        jobs = load_manifest(self.manifest)
+        self.assertEqual(len(jobs), 42)
+        self.assertEqual(jobs[0].source, os.path.join(self.directory.name, "Test3.txt"))
+        self.assertEqual(jobs[40], BatchJob(40, "inline", (1005, 1105, 4300), ()))
+        with open(self.manifest, "a") as f_out:
+            f_out.write('{"inputs": [1]}\n')
+        with self.assertRaises(ValueError):
+            load_manifest(self.manifest)
+
+    def test_run_job(self):
+        jobs = load_manifest(self.manifest)
+        result = run_job(jobs[2])
+        self.assertEqual(
+            (result.status, result.outputs, result.steps), ("halted", [22], 7)
+        )
+        result = run_job(jobs[40])
+        self.assertEqual((result.status, result.steps), ("error", 1))
+
+    def test_parallel_matches_sequential(self):
+        jobs = load_manifest(self.manifest)
+        expected = [run_job(job) for job in jobs[:41]]
+        results = list(run_batch(jobs[:41], workers=2, chunk_size=4))
+        self.assertEqual(sorted(results), expected)
+
+    def test_step_budget(self):
+        jobs = load_manifest(self.manifest)
+        results = list(run_batch(jobs[41:], workers=1, max_steps=100))
+        self.assertEqual([result.status for result in results], ["budget_exceeded"])
+
+
+@unittest.skipUnless(vector, "numpy is not installed")
+class TestLockstepEngine(unittest.TestCase):
+    def run_scalar(self, program, inputs):
+        controller = UVSimController(MagicMock())
+        controller.data_model.set_instructions(program + [0] * (100 - len(program)))
+        outputs = []
+        result = controller.execute_table(iter(inputs).__next__, outputs.append)
+        return result, outputs, list(controller.data_model.memory)
+
+    def test_matches_scalar_engine(self):
+        program = [1020, 2020, 4208, 3121, 2120, 1120, 4001, 0, 4300]
+        program += [0] * 12 + [1]
+        inputs = [[value] for value in (0, 3, 7, 1, 12)]
+        machine = vector.run_lockstep(program, inputs)
+        for lane, row in enumerate(inputs):
+            result, outputs, memory = self.run_scalar(program, row)
+            self.assertEqual(machine.get_status(lane), "halted")
+            self.assertEqual(machine.get_outputs(lane), outputs)
+            self.assertEqual(machine.memory[lane].tolist(), memory)
+            self.assertEqual(
+                (machine.steps[lane], machine.cursor[lane], machine.accumulator[lane]),
+                (result.steps, result.cursor, result.accumulator),
+            )
+
+    def test_test_programs(self):
+        inputs = [[20, 22], [-5, 5], [7, 0]]
+        for name in ("Test1.txt", "Test2.txt", "Test3.txt"):
+            program = list(program_cache.load(name))
+            machine = vector.run_lockstep(program, inputs)
+            for lane, row in enumerate(inputs):
+                _, outputs, _ = self.run_scalar(program, row)
+                self.assertEqual(machine.get_outputs(lane), outputs)
+
+    def test_faults(self):
+        program = [1010, 1011, 2010, 3211, 2112, 1112, 4300]
+        machine = vector.run_lockstep(program, [[8, 2, 0], [8, 0, 0], [8]])
+        self.assertEqual(
+            [machine.get_status(lane) for lane in range(3)],
+            ["halted", "divide_by_zero", "input_exhausted"],
+        )
+        self.assertEqual(machine.get_outputs(0), [4])
+        self.assertEqual(machine.cursor.tolist(), [0, 3, 1])
+        self.assertEqual(machine.steps.tolist(), [7, 3, 1])
+
+        machine = vector.run_lockstep([4000], [[]] * 2, max_steps=50)
+        self.assertEqual(machine.get_status(1), "budget_exceeded")
+        machine = vector.run_lockstep([9900], [[]])
+        self.assertEqual(machine.get_status(0), "invalid")
+        machine = vector.run_lockstep([2000] * 100, [[]])
+        self.assertEqual(machine.get_status(0), "out_of_range")
+
+
+@unittest.skipUnless(vector, "numpy is not installed")
+class TestVectorBatch(unittest.TestCase):
+    def setUp(self):
+        self.images = [
+            list(program_cache.load("Test1.txt")),
+            [1010, 1011, 2010, 3211, 2112, 1112, 4300],
+            list(COUNTDOWN_PROGRAM),
+            [2005, 9900],
+            [1009, 1010, 2009, 3310, 2111, 1111, 4300],
+        ]
+        self.inputs = [[20, 22], [9, 0], [], [], [6, 7]]
+
+    def test_distinct_programs(self):
+        machine = vector.run_programs(self.images, self.inputs)
+        self.assertEqual(
+            [machine.get_status(lane) for lane in range(5)],
+            ["halted", "divide_by_zero", "halted", "invalid", "halted"],
+        )
+        for lane in (0, 2, 4):
+            controller = UVSimController(MagicMock())
+            image = self.images[lane]
+            controller.data_model.set_instructions(image + [0] * (100 - len(image)))
+            outputs = []
+            result = controller.execute_table(
+                iter(self.inputs[lane]).__next__, outputs.append
+            )
+            self.assertEqual(machine.get_outputs(lane), outputs)
+            self.assertEqual(machine.steps[lane], result.steps)
+        self.assertEqual(machine.cursor[3], 1)
+
+    def test_program_too_long(self):
+        with self.assertRaises(IndexError):
+            vector.run_programs([[0] * 101])
+
+    def test_run_corpus(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        for number in range(5):
+            filename = os.path.join(directory.name, f"{number:02d}.txt")
+            with open(filename, "w") as f_out:
+                f_out.write("\n".join(["+1009", "+1010", "+2009"]))
+                f_out.write("\n".join(["", f"+{3010 + number * 100}", "+2111"]))
+                f_out.write("\n+1111\n+4300\n")
+        results = list(vector.run_corpus(directory.name, [12, 4], lanes=2))
+        self.assertEqual(
+            [result.outputs for result in results[:4]], [[16], [8], [3], [48]]
+        )
+        self.assertEqual(results[4].status, "invalid")
+        self.assertEqual(results[4].outputs, [])
+
+
+class TestAsyncExecution(unittest.TestCase):
+    def make_controller(self, program):
+        controller = UVSimController(MagicMock())
+        controller.data_model.set_instructions(list(program))
+        return controller
+
+    def test_concurrent_sessions(self):
+        program = [1020, 1120, 2021, 3122, 2121, 4207, 4000, 4300] + [0] * 92
+        program[21], program[22] = 3, 1
+
+        async def session(number, queue, outputs):
+            async def write_to_console(value):
+                outputs.append(value)
+
+            controller = self.make_controller(program)
+            return await controller.execute_async(queue.get, write_to_console)
+
+        async def main():
+            queues = [asyncio.Queue() for _ in range(200)]
+            outputs = [[] for _ in range(200)]
+            tasks = [
+                asyncio.create_task(session(number, queue, outputs[number]))
+                for number, queue in enumerate(queues)
+            ]
+            for value in range(3):
+                await asyncio.sleep(0)
+                self.assertTrue(all(len(output) == value for output in outputs))
+                for number, queue in enumerate(queues):
+                    queue.put_nowait(number * 10 + value)
+            results = await asyncio.gather(*tasks)
+            return results, outputs
+
+        results, outputs = asyncio.run(main())
+        self.assertEqual(outputs[7], [70, 71, 72])
+        self.assertEqual({result.status for result in results}, {"halted"})
+        self.assertEqual(results[0].steps, 21)
+
+    def test_quantum_yields(self):
+        program = [2010, 4205, 3111, 2110, 4000, 4300] + [0] * 94
+        program[10], program[11] = 3000, 1
+        events = []
+
+        async def ticker():
+            for _ in range(3):
+                events.append("tick")
+                await asyncio.sleep(0)
+
+        async def main():
+            controller = self.make_controller(program)
+            task = asyncio.create_task(ticker())
+            result = await controller.execute_async(None, None, quantum=1000)
+            events.append("done")
+            await task
+            return result
+
+        result = asyncio.run(main())
+        self.assertEqual(result.status, "halted")
+        self.assertEqual(result.steps, 5 * 3000 + 3)
+        self.assertEqual(events, ["tick"] * 3 + ["done"])
+
+    def test_sync_callbacks(self):
+        controller = self.make_controller(COUNTDOWN_PROGRAM)
+        write_to_console = MagicMock()
+        result = asyncio.run(controller.execute_async(None, write_to_console))
+        self.assertEqual(result, RunResult("halted", 33, 0, 0))
+        self.assertEqual(write_to_console.call_count, 5)
+        self.assertEqual(controller.writes, 5)
+
+
+class TestResumableExecution(unittest.TestCase):
+    def setUp(self):
+        self.program = [1020, 1120, 2021, 3122, 2121, 4207, 4000, 4300] + [0] * 92
+        self.program[21], self.program[22] = 2, 1
+
+    def make_run(self, quantum=None):
+        controller = UVSimController(MagicMock())
+        controller.data_model.set_instructions(list(self.program))
+        return controller.execute_resumable(quantum)
+
+    def test_events(self):
+        run = self.make_run()
+        self.assertEqual(next(run), IOEvent(0, "read", None))
+        self.assertEqual(run.send(8), IOEvent(1, "write", 8))
+        self.assertEqual(next(run), IOEvent(7, "read", None))
+        self.assertEqual(run.send(-3), IOEvent(8, "write", -3))
+        with self.assertRaises(StopIteration) as stop:
+            next(run)
+        self.assertEqual(stop.exception.value, RunResult("halted", 14, 0, 0))
+
+    def test_interleaved_runs(self):
+        runs = [self.make_run() for _ in range(3)]
+        events = [next(run) for run in runs]
+        outputs = [run.send(number) for number, run in enumerate(runs)]
+        self.assertEqual([event.value for event in outputs], [0, 1, 2])
+        self.assertEqual({event.kind for event in events}, {"read"})
+
+    def test_pause_and_invalid_input(self):
+        self.program[0:6] = [2010, 4205, 3111, 2110, 4000, 4300]
+        self.program[10], self.program[11] = 100, 1
+        run = self.make_run(quantum=128)
+        events = list(run)
+        self.assertEqual(len(events), 3)
+        self.assertEqual(events[0], IOEvent(128, "pause", None))
+        self.program[0] = 1020
+        run = self.make_run()
+        next(run)
+        with self.assertRaises(ValueError):
+            run.send(None)
+
+
+class TestScheduler(unittest.TestCase):
+    def test_runs_every_task(self):
+        scheduler = Scheduler(quantum=3, max_resident=2)
+        ids = [scheduler.submit(COUNTDOWN_PROGRAM[:12]) for _ in range(5)]
+        results = list(scheduler.run())
+        self.assertEqual(sorted(result.task_id for result in results), ids)
+        for result in results:
+            self.assertEqual(result.status, "halted")
+            self.assertEqual(result.outputs, [4, 3, 2, 1, 0])
+            self.assertGreater(result.slices, 1)
+        self.assertEqual(len(scheduler.pool), 2)
+
+    def test_priority_share(self):
+        scheduler = Scheduler(quantum=10)
+        high = scheduler.submit([4000], priority="high", max_steps=400)
+        low = scheduler.submit([4000], priority="low", max_steps=400)
+        for _ in range(40):
+            scheduler.step()
+        self.assertEqual(scheduler.usage[high], 4 * scheduler.usage[low])
+        results = {result.task_id: result for result in scheduler.run()}
+        self.assertEqual(results[low].status, "budget_exceeded")
+        self.assertEqual(results[low].steps, 400)
+        self.assertEqual(scheduler.usage, {})
+
+    def test_errors(self):
+        scheduler = Scheduler()
+        with self.assertRaises(ValueError):
+            scheduler.submit([4300], priority="urgent")
+        scheduler.submit([1010, 4300], inputs=[7], name="echo")
+        scheduler.submit([1010, 4300], name="starved")
+        scheduler.submit([1010, 1110, 1010, 4300], inputs=[7], name="short")
+        results = {result.name: result for result in scheduler.run()}
+        self.assertEqual(results["echo"].status, "halted")
+        self.assertEqual(results["starved"].status, "error")
+        self.assertEqual(results["starved"].steps, 1)
+        self.assertEqual(results["short"].status, "error")
+        self.assertEqual(results["short"].steps, 3)
+
+
+class TestFusion(unittest.TestCase):
+    def test_fuse_program(self):
+        data_model = DataModel()
+        program = [2010, 3011, 2112, 2013, 4207, 2010, 3111] + [0] * 93
+        data_model.set_instructions(program)
+        fused = fuse_program(data_model)
+        self.assertEqual(fused[0], ("load_add_store", (10, 11, 12)))
+        self.assertEqual(fused[3], ("load_branch_zero", (13, 7)))
+        self.assertFalse(fused[1])
+        self.assertFalse(fused[5])
+        self.assertEqual(fused.count(False), 98)
+
+    def test_rescan_written_cells(self):
+        data_model = DataModel()
+        data_model.set_instructions([2010, 3011, 2112, 2013, 4207] + [0] * 95)
+        fuse_program(data_model)
+        fused = data_model.fused
+        self.assertEqual(fused[0], ("load_add_store", (10, 11, 12)))
+        data_model.set_instruction(1, 3111)
+        self.assertEqual(data_model.rescan, {1: True})
+        self.assertFalse(fuse_cell(data_model, 1))
+        self.assertEqual(data_model.rescan, {})
+        self.assertEqual(
+            fuse_cell(data_model, 0), ("load_subtract_store", (10, 11, 12))
+        )
+        data_model.set_instruction(4, 4107)
+        self.assertEqual(fuse_cell(data_model, 3), ("load_branch_negative", (13, 7)))
+        data_model.set_instruction(3, 0)
+        self.assertFalse(fuse_program(data_model)[3])
+
+    def test_fused_run_invalidates_cache(self):
+        controller = UVSimController(halted=lambda: None)
+        program = [2010, 3011, 2112, 2013, 2100, 4000, 0, 0, 0, 0, 1, 2, 0, 4300]
+        controller.data_model.set_instructions(program + [0] * 86)
+        controller.execute_fused(None, MagicMock())
+        self.assertFalse(fuse_program(controller.data_model)[0])
+
+    def test_setup_scales_with_cells_run(self):
+        data_model = DataModel(65536)
+        data_model.set_instructions([4300000] + [0] * 65535)
+        controller = UVSimController(halted=lambda: None, data_model=data_model)
+        for engine in ("fused", "threaded", "jit"):
+            with self.subTest(engine=engine):
+                controller.reset_cursor()
+                controller.execute_program(None, None, engine)
+                self.assertEqual(controller.cursor, 0)
+        self.assertEqual(data_model.fused, {0: False})
+
+
+class TestBlockCache(unittest.TestCase):
+    def setUp(self):
+        self.data_model = DataModel()
+        self.data_model.set_instructions(list(COUNTDOWN_PROGRAM))
+        bindings = dict.fromkeys(BINDINGS)
+        bindings["regs"] = [0, 0]
+        bindings["write_to_console"] = MagicMock()
+        self.cache = BlockCache(self.data_model, bindings)
+
+    def test_compile_block(self):
+        block = self.cache.compile_block(2)
+        self.assertEqual(self.cache.ranges, {2: 5})
+        self.assertEqual(block(), 0)
+        self.assertEqual(self.cache.bindings["regs"][0], -1)
+        self.assertEqual(self.data_model.get_instruction(10), -1)
+
+    def test_store_into_later_cell_ends_block(self):
+        self.data_model.set_instruction(3, 2104)
+        self.cache.compile_block(2)
+        self.assertEqual(self.cache.ranges, {2: 3})
+
+    def test_invalidate(self):
+        self.cache.compile_block(0)
+        self.cache.compile_block(2)
+        self.cache.invalidate(1)
+        self.assertIsNone(self.cache.blocks[0])
+        self.assertIsNotNone(self.cache.blocks[2])
+        self.assertNotIn(0, self.cache.owners)
+        self.assertEqual(self.cache.owners[2], {2})
+
+
+    def test_hot_cell_is_interpreted(self):
+        for _ in range(REWRITE_LIMIT):
+            self.cache.compile_block(2)
+            self.cache.invalidate(3)
+        self.assertEqual(self.cache.hot, {3})
+        self.cache.compile_block(2)
+        self.assertEqual(self.cache.ranges, {2: 2})
+        block = self.cache.compile_block(3)
+        self.assertNotIn(3, self.cache.ranges)
+        self.assertEqual(block(), 4)
+        self.data_model.set_instruction(3, 2011)
+        self.assertEqual(block(), 4)
+        self.assertEqual(self.cache.bindings["regs"][0], 1)
+
+class TestBenchmark(unittest.TestCase):
+    def test_run_benchmark(self):
+        report = run_benchmark(["table", "uvsim"], ["counting_loop", "Test1"], 10, 2)
+        self.assertEqual(
+            [(r["workload"], r["engine"], r["steps"]) for r in report["results"]],
+            [
+                ("counting_loop", "table", 53),
+                ("counting_loop", "uvsim", 53),
+                ("Test1", "table", 7),
+                ("Test1", "uvsim", 7),
+            ],
+        )
+        for result in report["results"]:
+            self.assertGreater(result["instructions_per_second"], 0)
+            self.assertEqual(set(result["latency_ms"]), {"min", "p50", "p90", "p99"})
+            self.assertGreaterEqual(result["peak_bytes"], 0)
+            self.assertGreaterEqual(result["retained_blocks"], 0)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,324 @@
+"""Tracing
+
+This module manages the execution trace recorder components.
+
+A trace stores, per executed instruction, only its cursor and what it
+changed: nothing, the accumulator (as a difference from its previous
+value) or one memory word (as address and new value). Full memory and
+accumulator keyframes every keyframe_interval steps bound the replay needed
+to reconstruct any step.
+"""
+
+import lzma
+import struct
+import sys
+import zlib
+from array import array
+from bisect import bisect_right
+from typing import NamedTuple
+
+MAGIC = b"UVT\x00"
+VERSION = 1
+HEADER = struct.Struct("<4sBBBBIQQQqII")
+KEYFRAME = struct.Struct("<QQQq")
+UNCHANGED, ACCUMULATOR, WRITE = 0, 1, 2
+KINDS = {
+    10: WRITE,
+    21: WRITE,
+    20: ACCUMULATOR,
+    30: ACCUMULATOR,
+    31: ACCUMULATOR,
+    32: ACCUMULATOR,
+    33: ACCUMULATOR,
+}
+COMPRESSORS = {
+    None: (bytes, bytes),
+    "zlib": (zlib.compress, zlib.decompress),
+    "lzma": (lzma.compress, lzma.decompress),
+}
+CODECS = tuple(COMPRESSORS)
+
+
+class Keyframe(NamedTuple):
+    """Full state before a step and the delta offsets to replay from it."""
+
+    step: int
+    delta_offset: int
+    address_offset: int
+    accumulator: int
+    memory: array
+
+
+class TraceState(NamedTuple):
+    """Cursor of an executed step and the state it left behind."""
+
+    step: int
+    cursor: int
+    accumulator: int
+    memory: list
+
+
+def to_bytes(words: array) -> bytes:
+    """Gets little-endian bytes of a word array.
+
+    :param words: Word array
+    :return payload: Array contents in little-endian byte order
+    """
+    if sys.byteorder != "little":
+        words = array(words.typecode, words)
+        words.byteswap()
+    return words.tobytes()
+
+
+def from_bytes(typecode: str, payload) -> array:
+    """Builds a word array from little-endian bytes.
+
+    :param typecode: Array typecode of the words
+    :param payload: Bytes-like object holding the words
+    :return words: Word array
+    """
+    words = array(typecode)
+    words.frombytes(payload)
+    if sys.byteorder != "little":
+        words.byteswap()
+    return words
+
+
+class TraceRecorder:
+    """Manager for a delta-encoded execution trace."""
+
+    def __init__(self, keyframe_interval: int = 65536):
+        """TraceRecorder initializer.
+
+        :param keyframe_interval: Steps between full state keyframes
+        :return: None
+        """
+        if keyframe_interval < 1:
+            raise ValueError("Invalid keyframe interval: must be positive")
+        self.keyframe_interval = keyframe_interval
+        self.cursors = array("H")
+        self.kinds = array("B")
+        self.deltas = array("i")
+        self.addresses = array("I")
+        self.keyframes = []
+        self.accumulator = 0
+
+    def __len__(self) -> int:
+        """Gets number of recorded steps.
+
+        :param: None
+        :return steps: Number of recorded steps
+        """
+        return len(self.kinds)
+
+    def start(self, memory, accumulator: int) -> None:
+        """Records the initial keyframe unless the trace already has one.
+
+        Consecutive runs of one program, such as execute_bounded slices, may
+        share a recorder and extend the same trace.
+
+        :param memory: Main memory words before the first step
+        :param accumulator: Value in accumulator register before the first step
+        :return: None
+        """
+        if len(memory) > 65536 and self.cursors.typecode == "H":
+            self.cursors = array("I", self.cursors)
+        if not self.keyframes:
+            self.accumulator = accumulator
+            self.add_keyframe(accumulator, memory)
+
+    def add_keyframe(self, accumulator: int, memory) -> None:
+        """Records full state before the next step.
+
+        :param accumulator: Value in accumulator register
+        :param memory: Main memory words
+        :return: None
+        """
+        self.keyframes.append(
+            Keyframe(
+                len(self.kinds),
+                len(self.deltas),
+                len(self.addresses),
+                accumulator,
+                array("q", memory),
+            )
+        )
+
+    def record(self, cursor: int, kind: int, operand: int, accumulator, memory):
+        """Records one executed step.
+
+        :param cursor: Position of the executed instruction
+        :param kind: Change kind from KINDS, UNCHANGED for other operations
+        :param operand: Operand of the executed instruction
+        :param accumulator: Value in accumulator register after the step
+        :param memory: Main memory words after the step
+        :return: None
+        """
+        self.cursors.append(cursor)
+        if kind == WRITE:
+            self.kinds.append(WRITE)
+            self.addresses.append(operand)
+            self.append_delta(memory[operand])
+        elif kind == ACCUMULATOR and accumulator != self.accumulator:
+            self.kinds.append(ACCUMULATOR)
+            self.append_delta(accumulator - self.accumulator)
+            self.accumulator = accumulator
+        else:
+            self.kinds.append(UNCHANGED)
+        if not len(self.kinds) % self.keyframe_interval:
+            self.add_keyframe(accumulator, memory)
+
+    def append_delta(self, value: int) -> None:
+        """Appends a delta, widening the delta array to 64 bits if needed.
+
+        :param value: Accumulator difference or written memory value
+        :return: None
+        """
+        try:
+            self.deltas.append(value)
+        except OverflowError:
+            self.deltas = array("q", self.deltas)
+            self.deltas.append(value)
+
+    def iter_states(self, start: int = 0, stop: int = None):
+        """Reconstructs the state after each step in a range.
+
+        Replay begins at the nearest keyframe at or before start. The yielded
+        memory list is updated in place; copy it to keep a step's memory.
+
+        :param start: First step to yield
+        :param stop: Step to stop before, defaults to the trace length
+        :return states: Iterator of TraceState
+        """
+        stop = len(self) if stop is None else min(stop, len(self))
+        if not 0 <= start <= stop:
+            raise IndexError(f"Trace step '{start}' not in range.")
+        if start == stop:
+            return
+        steps = [keyframe.step for keyframe in self.keyframes]
+        keyframe = self.keyframes[bisect_right(steps, start) - 1]
+        accumulator = keyframe.accumulator
+        memory = list(keyframe.memory)
+        cursors, kinds = self.cursors, self.kinds
+        deltas, addresses = self.deltas, self.addresses
+        delta, address = keyframe.delta_offset, keyframe.address_offset
+
+        for step in range(keyframe.step, stop):
+            kind = kinds[step]
+            if kind == ACCUMULATOR:
+                accumulator += deltas[delta]
+                delta += 1
+            elif kind == WRITE:
+                memory[addresses[address]] = deltas[delta]
+                delta += 1
+                address += 1
+            if step >= start:
+                yield TraceState(step, cursors[step], accumulator, memory)
+
+    def state_at(self, step: int) -> TraceState:
+        """Reconstructs the state after one step.
+
+        :param step: Index of the executed step
+        :return state: TraceState with its own copy of memory
+        """
+        if not 0 <= step < len(self):
+            raise IndexError(f"Trace step '{step}' not in range.")
+        state = next(self.iter_states(step, step + 1))
+        return state._replace(memory=list(state.memory))
+
+    def dump(self, compression: str = None) -> bytes:
+        """Serializes the trace.
+
+        :param compression: None, "zlib" or "lzma"
+        :return blob: Trace bytes
+        """
+        if compression not in COMPRESSORS:
+            raise ValueError(f"Invalid compression '{compression}'")
+        memory_size = len(self.keyframes[0].memory) if self.keyframes else 0
+        header = HEADER.pack(
+            MAGIC,
+            VERSION,
+            CODECS.index(compression),
+            self.cursors.itemsize,
+            self.deltas.itemsize,
+            memory_size,
+            len(self),
+            len(self.deltas),
+            len(self.addresses),
+            self.accumulator,
+            self.keyframe_interval,
+            len(self.keyframes),
+        )
+        parts = [
+            to_bytes(self.cursors),
+            self.kinds.tobytes(),
+            to_bytes(self.deltas),
+            to_bytes(self.addresses),
+        ]
+        for keyframe in self.keyframes:
+            parts.append(KEYFRAME.pack(*keyframe[:4]))
+            parts.append(to_bytes(keyframe.memory))
+        compress = COMPRESSORS[compression][0]
+        return header + compress(b"".join(parts))
+
+    @classmethod
+    def load(cls, blob):
+        """Deserializes a trace written by dump.
+
+        :param blob: Bytes-like object holding the whole trace
+        :return recorder: TraceRecorder holding the trace
+        """
+        if len(blob) < HEADER.size:
+            raise ValueError("Invalid trace: truncated header")
+        (
+            magic,
+            version,
+            codec,
+            cursor_size,
+            delta_size,
+            memory_size,
+            steps,
+            delta_count,
+            address_count,
+            accumulator,
+            keyframe_interval,
+            keyframe_count,
+        ) = HEADER.unpack_from(blob)
+        if magic != MAGIC or version != VERSION or codec >= len(CODECS):
+            raise ValueError("Invalid trace: unsupported format")
+        decompress = COMPRESSORS[CODECS[codec]][1]
+        try:
+            body = memoryview(decompress(bytes(blob[HEADER.size :])))
+        except (zlib.error, lzma.LZMAError):
+            raise ValueError("Invalid trace: corrupt compressed body")
+        sizes = [
+            steps * cursor_size,
+            steps,
+            delta_count * delta_size,
+            address_count * 4,
+        ]
+        keyframe_size = KEYFRAME.size + memory_size * 8
+        if len(body) != sum(sizes) + keyframe_count * keyframe_size:
+            raise ValueError("Invalid trace: truncated body")
+
+        recorder = cls(keyframe_interval)
+        typecodes = (
+            "H" if cursor_size == 2 else "I",
+            "B",
+            "i" if delta_size == 4 else "q",
+            "I",
+        )
+        offset = 0
+        arrays = []
+        for typecode, size in zip(typecodes, sizes):
+            arrays.append(from_bytes(typecode, body[offset : offset + size]))
+            offset += size
+        recorder.cursors, recorder.kinds, recorder.deltas, recorder.addresses = arrays
+        for _ in range(keyframe_count):
+            fields = KEYFRAME.unpack_from(body, offset)
+            offset += KEYFRAME.size
+            memory = from_bytes("q", body[offset : offset + memory_size * 8])
+            offset += memory_size * 8
+            recorder.keyframes.append(Keyframe(*fields, memory))
+        recorder.accumulator = accumulator
+        return recorder
@@ -0,0 +1,260 @@
+"""UVB
+
+This module manages the binary program image components.
+
+A .uvb image is a fixed header followed by fixed-width little-endian
+signed words. The header holds the magic bytes, format version, word size
+in bytes, flags, target memory size, word count and a CRC-32 of the words
+when the checksum flag is set.
+
+A checkpoint blob uses the same word encoding behind its own header, which
+adds the memory geometry, registers and I/O position of a paused run.
+"""
+
+import argparse
+import mmap
+import struct
+import sys
+import zlib
+from array import array
+from typing import NamedTuple
+
+MAGIC = b"UVB\x00"
+VERSION = 1
+HEADER = struct.Struct("<4sBBHIII")
+CHECKSUM = 0x1
+TYPECODES = {4: "i", 8: "q"}
+CHECKPOINT_MAGIC = b"UVC\x00"
+CHECKPOINT = struct.Struct("<4sBBBxIIqqqQQI")
+COMPRESSED = 0x2
+
+
+class Checkpoint(NamedTuple):
+    """Memory, registers and I/O position of a paused run."""
+
+    memory: array
+    operand_base: int
+    accumulator: int
+    cursor: int
+    instruction: int
+    reads: int
+    writes: int
+
+
+def write_image(
+    filename: str, image, memory_size: int = 100, word_size: int = 4, checksum=True
+) -> None:
+    """Writes program image to a .uvb file.
+
+    :param filename: String containing file path
+    :param image: Instruction values in memory order
+    :param memory_size: Number of words in the target main memory
+    :param word_size: Bytes per word, 4 or 8
+    :param checksum: Whether to store a CRC-32 of the words
+    :return: None
+    """
+    if word_size not in TYPECODES:
+        raise ValueError(f"Invalid word size '{word_size}': must be 4 or 8")
+    if len(image) > memory_size:
+        raise IndexError(f"Program exceeds {memory_size} memory words.")
+    words = array(TYPECODES[word_size], image)
+    if sys.byteorder != "little":
+        words.byteswap()
+    payload = words.tobytes()
+    header = HEADER.pack(
+        MAGIC,
+        VERSION,
+        word_size,
+        CHECKSUM if checksum else 0,
+        memory_size,
+        len(words),
+        zlib.crc32(payload) if checksum else 0,
+    )
+    with open(filename, "wb") as f_out:
+        f_out.write(header)
+        f_out.write(payload)
+
+
+def convert_text(
+    source: str, target: str, memory_size: int = 100, word_size: int = 4
+) -> None:
+    """Converts BasicML text program into a .uvb file.
+
+    :param source: String containing text program file path
+    :param target: String containing .uvb file path
+    :param memory_size: Number of words in the target main memory
+    :param word_size: Bytes per word, 4 or 8
+    :return: None
+    """
+    from model import parse_program  # model imports this module
+
+    with open(source, "r") as f_in:
+        image = parse_program(f_in)
+    write_image(target, image, memory_size, word_size)
+
+
+def read_header(buffer) -> tuple:
+    """Reads and validates .uvb header.
+
+    :param buffer: Bytes-like object holding the whole file
+    :return word_size, flags, memory_size, count, checksum: Header fields
+    """
+    if len(buffer) < HEADER.size:
+        raise ValueError("Invalid program image: truncated header")
+    magic, version, word_size, flags, memory_size, count, checksum = (
+        HEADER.unpack_from(buffer)
+    )
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Invalid program image: unsupported format")
+    if word_size not in TYPECODES:
+        raise ValueError(f"Invalid program image: word size '{word_size}'")
+    if len(buffer) < HEADER.size + count * word_size:
+        raise ValueError("Invalid program image: truncated words")
+    return word_size, flags, memory_size, count, checksum
+
+
+def unpack_image(buffer, verify=True) -> tuple[int, array]:
+    """Reads .uvb words from a buffer in one bulk copy.
+
+    :param buffer: Bytes-like object holding the whole file
+    :param verify: Whether to check the stored CRC-32
+    :return memory_size, words: Target memory size and word array
+    """
+    word_size, flags, memory_size, count, checksum = read_header(buffer)
+    with memoryview(buffer) as view:
+        payload = view[HEADER.size : HEADER.size + count * word_size]
+        try:
+            if verify and flags & CHECKSUM and zlib.crc32(payload) != checksum:
+                raise ValueError("Invalid program image: checksum mismatch")
+            words = array(TYPECODES[word_size])
+            words.frombytes(payload)
+        finally:
+            payload.release()
+    if sys.byteorder != "little":
+        words.byteswap()
+    return memory_size, words
+
+
+def read_image(filename: str, verify=True) -> tuple[int, array]:
+    """Maps .uvb file and reads its words in one bulk copy.
+
+    :param filename: String containing file path
+    :param verify: Whether to check the stored CRC-32
+    :return memory_size, words: Target memory size and word array
+    """
+    with open(filename, "rb") as f_in:
+        with mmap.mmap(f_in.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return unpack_image(mapped, verify)
+
+
+def pack_checkpoint(
+    memory,
+    operand_base: int,
+    accumulator: int,
+    cursor: int,
+    instruction: int,
+    reads: int,
+    writes: int,
+    compress=False,
+) -> bytes:
+    """Packs memory and runtime registers into a checkpoint blob.
+
+    Words are stored 4 bytes wide unless a value needs 8. The CRC-32 covers
+    the header fields and the uncompressed words.
+
+    :param memory: Main memory words in memory order
+    :param operand_base: Instruction operand base of the data model
+    :param accumulator: Value in accumulator register
+    :param cursor: Position in instruction set runtime
+    :param instruction: Value in instruction register
+    :param reads: Number of READ inputs consumed
+    :param writes: Number of WRITE outputs produced
+    :param compress: Whether to zlib-compress the words
+    :return blob: Checkpoint bytes
+    """
+    try:
+        words = array("i", memory)
+    except OverflowError:
+        words = array("q", memory)
+    if sys.byteorder != "little":
+        words.byteswap()
+    payload = words.tobytes()
+    header = CHECKPOINT.pack(
+        CHECKPOINT_MAGIC,
+        VERSION,
+        words.itemsize,
+        CHECKSUM | (COMPRESSED if compress else 0),
+        len(words),
+        operand_base,
+        accumulator,
+        cursor,
+        instruction,
+        reads,
+        writes,
+        0,
+    )[:-4]
+    header += struct.pack("<I", zlib.crc32(payload, zlib.crc32(header)))
+    if compress:
+        payload = zlib.compress(payload)
+    return header + payload
+
+
+def unpack_checkpoint(blob) -> Checkpoint:
+    """Unpacks and validates a checkpoint blob.
+
+    :param blob: Bytes-like object holding the whole checkpoint
+    :return checkpoint: Memory words, operand base, registers and I/O counts
+    """
+    if len(blob) < CHECKPOINT.size:
+        raise ValueError("Invalid checkpoint: truncated header")
+    (
+        magic,
+        version,
+        word_size,
+        flags,
+        memory_size,
+        operand_base,
+        accumulator,
+        cursor,
+        instruction,
+        reads,
+        writes,
+        checksum,
+    ) = CHECKPOINT.unpack_from(blob)
+    if magic != CHECKPOINT_MAGIC or version != VERSION:
+        raise ValueError("Invalid checkpoint: unsupported format")
+    if word_size not in TYPECODES:
+        raise ValueError(f"Invalid checkpoint: word size '{word_size}'")
+    payload = bytes(blob[CHECKPOINT.size :])
+    if flags & COMPRESSED:
+        try:
+            payload = zlib.decompress(payload)
+        except zlib.error:
+            raise ValueError("Invalid checkpoint: corrupt compressed words")
+    if len(payload) != memory_size * word_size:
+        raise ValueError("Invalid checkpoint: truncated words")
+    if flags & CHECKSUM:
+        if zlib.crc32(payload, zlib.crc32(blob[: CHECKPOINT.size - 4])) != checksum:
+            raise ValueError("Invalid checkpoint: checksum mismatch")
+    words = array(TYPECODES[word_size])
+    words.frombytes(payload)
+    if sys.byteorder != "little":
+        words.byteswap()
+    return Checkpoint(
+        words, operand_base, accumulator, cursor, instruction, reads, writes
+    )
+
+
+def main():
+    """Main script driver."""
+    parser = argparse.ArgumentParser(description="Convert BasicML text to .uvb.")
+    parser.add_argument("source")
+    parser.add_argument("target")
+    parser.add_argument("--memory-size", type=int, default=100)
+    parser.add_argument("--word-size", type=int, choices=sorted(TYPECODES), default=4)
+    args = parser.parse_args()
+    convert_text(args.source, args.target, args.memory_size, args.word_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,358 @@
+"""Vector
+
+This module manages the vectorized batch engine components.
+
+N machines are held as NumPy arrays: an N x memory_size memory matrix and
+accumulator, cursor, status and step vectors. Each tick gathers every
+running lane's instruction, buckets lanes by operation code and applies
+each bucket as one masked array operation, so lanes may branch apart and
+still share ticks. Words are 64-bit, so ADD and SUBTRACT wrap where the
+scalar engines would grow without bound. MULTIPLY and DIVIDE reduce modulo
+the word size, operand_base * 100, as the scalar engines do.
+"""
+
+from itertools import islice
+from typing import NamedTuple
+
+import numpy as np
+
+from model import iter_programs
+
+RUNNING, HALTED, INVALID, DIVIDE_BY_ZERO, INPUT_EXHAUSTED, OUT_OF_RANGE = range(6)
+BUDGET_EXCEEDED = 6
+STATUSES = (
+    "running",
+    "halted",
+    "invalid",
+    "divide_by_zero",
+    "input_exhausted",
+    "out_of_range",
+    "budget_exceeded",
+)
+
+
+class LaneResult(NamedTuple):
+    """Outcome of one program in a vectorized batch."""
+
+    name: str
+    status: str
+    outputs: list
+    accumulator: int
+    cursor: int
+    steps: int
+
+
+def pad_rows(rows) -> tuple:
+    """Packs rows of possibly unequal length into a zero-padded matrix.
+
+    :param rows: 2D array or sequence of value sequences
+    :return matrix, counts: Padded int64 matrix and length of each row
+    """
+    if isinstance(rows, np.ndarray) and rows.ndim == 2:
+        return rows.astype(np.int64), np.full(len(rows), rows.shape[1], np.int64)
+    rows = [list(row) for row in rows]
+    counts = np.array([len(row) for row in rows], dtype=np.int64)
+    matrix = np.zeros((len(rows), counts.max(initial=0)), dtype=np.int64)
+    for idx, row in enumerate(rows):
+        matrix[idx, : len(row)] = row
+    return matrix, counts
+
+
+def mark(status, size: int, positions, code: int, mask=None):
+    """Sets status code of retiring lanes within one tick.
+
+    :param status: Status codes of the tick's lanes, or None if all run
+    :param size: Number of lanes in the tick
+    :param positions: Positions of a bucket's lanes within the tick
+    :param code: Status code to set
+    :param mask: Which of the bucket's lanes retire, defaults to all
+    :return status: Status codes of the tick's lanes
+    """
+    if status is None:
+        status = np.zeros(size, dtype=np.int8)
+    if mask is not None:
+        positions = np.arange(size)[positions][mask]
+    status[positions] = code
+    return status
+
+
+class VectorMachine:
+    """Manager for N machine instances stepped together."""
+
+    def __init__(self, memory, inputs=None, operand_base: int = 100):
+        """VectorMachine initializer.
+
+        :param memory: N x memory_size matrix of initial memory words
+        :param inputs: Row of READ values per lane, consumed in order
+        :param operand_base: Instruction operand base, see DataModel
+        :return: None
+        """
+        self.memory = np.array(memory, dtype=np.int64, ndmin=2)
+        lanes = len(self.memory)
+        if inputs is None:
+            inputs = np.zeros((lanes, 0), dtype=np.int64)
+        self.inputs, self.input_count = pad_rows(inputs)
+        if len(self.inputs) != lanes:
+            raise ValueError(f"Input matrix must have {lanes} rows.")
+        self.operand_base = operand_base
+        self.word_modulus = operand_base * 100
+        self.accumulator = np.zeros(lanes, dtype=np.int64)
+        self.cursor = np.zeros(lanes, dtype=np.int64)
+        self.status = np.full(lanes, RUNNING, dtype=np.int8)
+        self.steps = np.zeros(lanes, dtype=np.int64)
+        self.read_position = np.zeros(lanes, dtype=np.int64)
+        self.outputs = np.zeros((lanes, 8), dtype=np.int64)
+        self.output_count = np.zeros(lanes, dtype=np.int64)
+        self.flat = self.memory.reshape(-1)
+        self.rows = np.arange(lanes) * self.memory.shape[1]
+        self.live = np.arange(lanes)
+        self.ticks = 0
+
+    def emit(self, lanes, values) -> None:
+        """Appends WRITE outputs to their lanes' output rows.
+
+        :param lanes: Lane indexes
+        :param values: Value written by each lane
+        :return: None
+        """
+        counts = self.output_count[lanes]
+        if counts.max() >= self.outputs.shape[1]:
+            grown = np.zeros((len(self.outputs), 2 * self.outputs.shape[1]), np.int64)
+            grown[:, : self.outputs.shape[1]] = self.outputs
+            self.outputs = grown
+        self.outputs[lanes, counts] = values
+        self.output_count[lanes] = counts + 1
+
+    def step(self) -> bool:
+        """Executes one instruction in every running lane.
+
+        When every running lane fetches the same operation code, the tick is
+        one bucket and no lane partitioning is done. A lane that faults keeps
+        its cursor on the faulting instruction.
+
+        :param: None
+        :return running: Whether any lane is still running
+        """
+        live, flat, accumulator = self.live, self.flat, self.accumulator
+        if not len(live):
+            return False
+        memory_size = self.memory.shape[1]
+        if len(live) == len(self.memory):
+            select, rows = slice(None), self.rows
+        else:
+            select, rows = live, self.rows[live]
+        cursor = self.cursor[select]
+        status = None
+        next_cursor = cursor + 1
+
+        outside = None
+        if cursor.max() >= memory_size:
+            outside = cursor >= memory_size
+            status = mark(status, len(live), outside, OUT_OF_RANGE)
+            cursor = np.where(outside, 0, cursor)
+        codes, operands = np.divmod(np.abs(flat[rows + cursor]), self.operand_base)
+        if outside is not None:
+            codes[outside] = -1
+
+        low, high = codes.min(), codes.max()
+        if low == high:
+            buckets = ((low, None),)
+        else:
+            clipped = np.clip(codes, -1, 100)
+            buckets = [
+                (code - 1, np.flatnonzero(clipped == code - 1))
+                for code in np.flatnonzero(np.bincount(clipped + 1))
+            ]
+
+        for code, positions in buckets:
+            if positions is None:
+                positions = slice(None)
+                lanes, ids, operand = select, live, operands
+                addresses = rows + operands
+            else:
+                lanes = ids = live[positions]
+                operand = operands[positions]
+                addresses = rows[positions] + operand
+            if code == -1:
+                continue
+            elif code == 10:
+                read = self.read_position[ids]
+                exhausted = read >= self.input_count[ids]
+                if exhausted.any():
+                    status = mark(
+                        status, len(live), positions, INPUT_EXHAUSTED, exhausted
+                    )
+                    ids, read = ids[~exhausted], read[~exhausted]
+                    addresses = addresses[~exhausted]
+                flat[addresses] = self.inputs[ids, read]
+                self.read_position[ids] = read + 1
+            elif code == 11:
+                self.emit(ids, flat[addresses])
+            elif code == 20:
+                accumulator[lanes] = flat[addresses]
+            elif code == 21:
+                flat[addresses] = accumulator[lanes]
+            elif code == 30:
+                accumulator[lanes] += flat[addresses]
+            elif code == 31:
+                accumulator[lanes] -= flat[addresses]
+            elif code == 32:
+                divisor = flat[addresses]
+                zero = divisor == 0
+                if zero.any():
+                    status = mark(status, len(live), positions, DIVIDE_BY_ZERO, zero)
+                    lanes, divisor = ids[~zero], divisor[~zero]
+                quotient = accumulator[lanes] // divisor
+                accumulator[lanes] = quotient % self.word_modulus
+            elif code == 33:
+                product = accumulator[lanes] * flat[addresses]
+                accumulator[lanes] = product % self.word_modulus
+            elif code == 40:
+                next_cursor[positions] = operand
+            elif code in (41, 42):
+                values = accumulator[lanes]
+                taken = values < 0 if code == 41 else values == 0
+                next_cursor[positions] = np.where(
+                    taken, operand, next_cursor[positions]
+                )
+            elif code == 43:
+                status = mark(status, len(live), positions, HALTED)
+                next_cursor[positions] = operand
+            else:
+                status = mark(status, len(live), positions, INVALID)
+
+        if status is not None:
+            faulted = status > HALTED
+            next_cursor[faulted] = self.cursor[live[faulted]]
+            retired = status != RUNNING
+            self.steps[live[retired]] = self.ticks + ~faulted[retired]
+        self.cursor[select] = next_cursor
+        self.ticks += 1
+        if status is not None:
+            self.status[select] = status
+            self.live = live[status == RUNNING]
+        return len(self.live) > 0
+
+    def run(self, max_steps: int = None) -> np.ndarray:
+        """Steps all lanes until every lane halts or faults.
+
+        :param max_steps: Maximum number of ticks, after which running lanes
+            are marked BUDGET_EXCEEDED
+        :return status: Status code per lane, see STATUSES
+        """
+        while len(self.live):
+            if max_steps is not None and self.ticks >= max_steps:
+                self.steps[self.live] = self.ticks
+                self.status[self.live] = BUDGET_EXCEEDED
+                self.live = self.live[:0]
+                break
+            self.step()
+        return self.status
+
+    def get_outputs(self, lane: int) -> list:
+        """Gets WRITE outputs of one lane.
+
+        :param lane: Lane index
+        :return outputs: Values written by the lane in order
+        """
+        return self.outputs[lane, : self.output_count[lane]].tolist()
+
+    def get_status(self, lane: int) -> str:
+        """Gets status name of one lane.
+
+        :param lane: Lane index
+        :return status: Name from STATUSES
+        """
+        return STATUSES[self.status[lane]]
+
+
+def run_lockstep(
+    program, inputs, memory_size: int = 100, operand_digits: int = None, max_steps=None
+) -> VectorMachine:
+    """Runs one program over every row of READ inputs in lockstep.
+
+    :param program: Program instructions starting at memory index 0
+    :param inputs: Row of READ values per run, one run per row
+    :param memory_size: Number of words in main memory
+    :param operand_digits: Number of decimal digits in instruction operand
+    :param max_steps: Maximum number of ticks
+    :return machine: VectorMachine holding the final state of every run
+    """
+    if len(program) > memory_size:
+        raise IndexError(f"Program exceeds {memory_size} memory words.")
+    if operand_digits is None:
+        operand_digits = len(str(memory_size - 1))
+    memory = np.zeros((len(inputs), memory_size), dtype=np.int64)
+    memory[:, : len(program)] = program
+    machine = VectorMachine(memory, inputs, 10**operand_digits)
+    machine.run(max_steps)
+    return machine
+
+
+def run_programs(
+    images,
+    inputs=None,
+    memory_size: int = 100,
+    operand_digits: int = None,
+    max_steps=None,
+) -> VectorMachine:
+    """Runs K different program images together, one lane per image.
+
+    :param images: Program images, each starting at memory index 0
+    :param inputs: Row of READ values per image, defaults to none
+    :param memory_size: Number of words in main memory
+    :param operand_digits: Number of decimal digits in instruction operand
+    :param max_steps: Maximum number of ticks
+    :return machine: VectorMachine holding the final state of every program
+    """
+    memory, lengths = pad_rows(images)
+    if len(memory) and lengths.max() > memory_size:
+        raise IndexError(f"Program exceeds {memory_size} memory words.")
+    if operand_digits is None:
+        operand_digits = len(str(memory_size - 1))
+    matrix = np.zeros((len(memory), memory_size), dtype=np.int64)
+    matrix[:, : memory.shape[1]] = memory
+    machine = VectorMachine(matrix, inputs, 10**operand_digits)
+    machine.run(max_steps)
+    return machine
+
+
+def run_corpus(
+    source: str,
+    inputs=(),
+    lanes: int = 4096,
+    memory_size: int = 100,
+    max_steps=None,
+    skip_invalid: bool = False,
+):
+    """Runs every program of a corpus in vectorized batches of lanes.
+
+    Programs are streamed from iter_programs, so only one batch is held in
+    memory at a time, and every program reads the same inputs.
+
+    :param source: String containing corpus path, see iter_programs
+    :param inputs: READ values fed to every program
+    :param lanes: Number of programs run together per batch
+    :param memory_size: Number of words in main memory
+    :param max_steps: Maximum number of ticks per batch
+    :param skip_invalid: Whether to skip programs that fail to parse
+    :return: Generator of LaneResult in corpus order
+    """
+    programs = iter_programs(source, skip_invalid)
+    while True:
+        batch = list(islice(programs, lanes))
+        if not batch:
+            break
+        names, images = zip(*batch)
+        machine = run_programs(
+            images, [inputs] * len(images), memory_size, max_steps=max_steps
+        )
+        for lane, name in enumerate(names):
+            yield LaneResult(
+                name,
+                machine.get_status(lane),
+                machine.get_outputs(lane),
+                int(machine.accumulator[lane]),
+                int(machine.cursor[lane]),
+                int(machine.steps[lane]),
+            )
@@ -170,10 +170,9 @@ class UVSimGUI(customtkinter.CTk):
         :param: None
         :return: None
         """
+        self.uvsim.restore_program()
         self.uvsim.reset_accumulator()
-        self.uvsim.reset_cursor()
-        self.uvsim.reset_instruction()
-        self.open_program(filename=self.filename)
+        self.update_program()
         self.reset_textboxes()
         self.uvsim.execute_program(self.read_from_user, self.write_to_console)
 